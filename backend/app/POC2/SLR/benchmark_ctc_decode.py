@@ -0,0 +1,81 @@
+import argparse
+import time
+from collections import defaultdict
+
+import torch
+
+from ctc_decode import ctc_beam_search_decoder, ctc_greedy_decoder, collapse_repeats_and_remove_blanks, log_sum_exp
+
+
+def naive_ctc_beam_search_decoder(log_probs_batch, input_lengths, beam_width=3, blank_idx=1):
+    """Previous ctc_beam_search_decoder (full vocab per beam, one .item() per score), kept as the baseline."""
+    B, T, V = log_probs_batch.shape
+    results = []
+
+    for b in range(B):
+        log_probs = log_probs_batch[b][:input_lengths[b]]  # (T_b, V)
+        T_b = log_probs.size(0)
+        beams = [([], 0.0)] # (sequence, score)
+
+        for t in range(T_b):
+            new_beams = defaultdict(lambda: -float("inf"))
+
+            for seq, score in beams:
+                for i in range(V):
+                    new_seq = list(seq)
+                    if i != blank_idx:
+                        if len(seq) == 0 or seq[-1] != i:
+                            new_seq.append(i)
+
+                    new_score = score + log_probs[t, i].item()
+                    new_beams[tuple(new_seq)] = log_sum_exp(new_beams[tuple(new_seq)], new_score)
+
+            beams = sorted(new_beams.items(), key=lambda x: x[1], reverse=True)[:beam_width]
+
+        best_seq, _ = beams[0]
+        best_seq = collapse_repeats_and_remove_blanks(list(best_seq), blank_idx)
+        results.append(best_seq)
+
+    return results
+
+
+def random_log_probs(batch_size, max_len, vocab_size, blank_idx, seed=0):
+    """Peaky random CTC outputs (mostly blanks, like a trained model)."""
+    generator = torch.Generator().manual_seed(seed)
+    logits = torch.randn(batch_size, max_len, vocab_size, generator=generator) * 3
+    logits[:, :, blank_idx] += 4
+    input_lengths = torch.randint(max_len // 2, max_len + 1, (batch_size,), generator=generator)
+    input_lengths[0] = max_len
+    return torch.log_softmax(logits, dim=-1), input_lengths
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CTC prefix beam search against the previous decoder.")
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--max_len", type=int, default=100)
+    parser.add_argument("--vocab_size", type=int, default=1100)
+    parser.add_argument("--beam_widths", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--skip_naive", action="store_true", help="Only time the new decoder (the baseline is very slow).")
+    parser.add_argument("--blank_idx", type=int, default=1)
+    args = parser.parse_args()
+
+    log_probs, input_lengths = random_log_probs(args.batch_size, args.max_len, args.vocab_size, args.blank_idx)
+    print(f"B={args.batch_size}, T<={args.max_len}, V={args.vocab_size}")
+
+    greedy = ctc_greedy_decoder(log_probs, input_lengths, args.blank_idx)
+    for beam_width in args.beam_widths:
+        decoded, elapsed = timed(ctc_beam_search_decoder, log_probs, input_lengths, beam_width=beam_width, blank_idx=args.blank_idx)
+        line = f"beam_width={beam_width:>3}  prefix beam search: {elapsed * 1000:9.1f} ms"
+        if beam_width == 1:
+            line += f"  (identical to greedy: {decoded == greedy})"
+        if not args.skip_naive:
+            naive_decoded, naive_elapsed = timed(naive_ctc_beam_search_decoder, log_probs, input_lengths, beam_width=beam_width, blank_idx=args.blank_idx)
+            line += f"  | previous decoder: {naive_elapsed * 1000:9.1f} ms  (x{naive_elapsed / max(elapsed, 1e-9):.0f})"
+            line += f"  same output: {sum(a == b for a, b in zip(decoded, naive_decoded))}/{len(decoded)}"
+        print(line)
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 class BiLSTMEncoder(nn.Module):
     def __init__(self, input_dim: int, lstm_hidden_dim: int, num_layers: int, dropout: float = 0.4):
@@ -25,16 +26,23 @@ class BiLSTMEncoder(nn.Module):
             bidirectional=True
         )
 
-    def forward(self, x: torch.Tensor, src_key_padding_mask=None) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, src_key_padding_mask=None, lengths=None) -> torch.Tensor:
         """
         Args:
             x (Tensor): Input tensor de forme (batch_size, seq_len, input_dim).
             src_key_padding_mask : Ignoré par le LSTM de base, mais gardé pour compatibilité d'interface si besoin.
+            lengths (Tensor): Longueurs valides (batch_size,) d'un batch paddé. Si fourni, la séquence est
+                              packée (pack_padded_sequence) pour que le LSTM arrière ne lise pas le padding.
 
         Returns:
             Tensor: Sortie encodée de forme (batch_size, seq_len, 2 * lstm_hidden_dim)
         """
-        output, (h_n, c_n) = self.lstm(x)
+        if lengths is None:
+            output, (h_n, c_n) = self.lstm(x)
+            return output
+        packed = pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+        packed_output, (h_n, c_n) = self.lstm(packed)
+        output, _ = pad_packed_sequence(packed_output, batch_first=True, total_length=x.size(1))
         return output
 
     def get_output_dim(self):
@@ -1,5 +1,6 @@
 import math
-from collections import defaultdict
+import numpy as np
+import torch
 
 def log_sum_exp(a, b):
     if a == -float("inf"):
@@ -22,44 +23,199 @@ def collapse_repeats_and_remove_blanks(seq, blank_idx):
         prev = token
     return collapsed
 
-def ctc_beam_search_decoder(log_probs_batch, input_lengths, beam_width=3, blank_idx=1):
+def ctc_greedy_decode_batch(log_probs, input_lengths, blank_idx=1, time_major=False):
     """
-    Beam search CTC decoder with blank filtering and repeat collapsing.
+    Vectorized best-path CTC decoding over a whole batch, without per-sample Python loops.
+    A frame is kept when it is not a blank, differs from the previous frame (shift-compare)
+    and lies within its sequence length; kept tokens are then compacted to the left with a
+    cumulative sum. Everything runs on the log_probs device, with one transfer at the end.
+
+    Args:
+        log_probs (Tensor): (B, T, V) log-probs, or (T, B, V) if time_major
+        input_lengths (Tensor | list): Lengths for each sequence
+        blank_idx (int): Index of the blank token
+        time_major (bool): Whether log_probs is (T, B, V) (V2 models, CTCLoss layout)
+
+    Returns:
+        (np.ndarray, np.ndarray): (B, L) token ids padded with -1, and (B,) decoded lengths
+    """
+    best_path = torch.argmax(log_probs, dim=-1)
+    if time_major:
+        best_path = best_path.transpose(0, 1)
+    B, T = best_path.shape
+    device = best_path.device
+    lengths = torch.as_tensor(input_lengths, device=device).long().reshape(B)
+
+    keep = best_path != blank_idx
+    keep[:, 1:] &= best_path[:, 1:] != best_path[:, :-1]
+    keep &= torch.arange(T, device=device).unsqueeze(0) < lengths.unsqueeze(1)
+
+    counts = keep.sum(dim=1)
+    max_len = int(counts.max()) if B > 0 else 0
+    token_ids = torch.full((B, max_len), -1, dtype=torch.long, device=device)
+    positions = torch.cumsum(keep, dim=1) - 1
+    rows = torch.arange(B, device=device).unsqueeze(1).expand(B, T)
+    token_ids[rows[keep], positions[keep]] = best_path[keep]
+    return token_ids.cpu().numpy(), counts.cpu().numpy()
+
+
+def ids_to_strings(token_ids, lengths, vocab_tokens, skip_ids=None):
+    """
+    Turns padded token id arrays into space-joined strings with one vocab array lookup.
+
+    Args:
+        token_ids (np.ndarray): (B, L) token ids, padded with -1
+        lengths (np.ndarray): (B,) number of valid ids per row
+        vocab_tokens (np.ndarray | list): Token string of each id
+        skip_ids (list): Ids dropped from the output (e.g. padding)
+
+    Returns:
+        List[str]: Decoded sentences
+    """
+    token_ids = np.asarray(token_ids)
+    vocab_tokens = np.asarray(vocab_tokens, dtype=object)
+    tokens = vocab_tokens[np.maximum(token_ids, 0)]
+    mask = np.arange(token_ids.shape[1])[np.newaxis, :] < np.asarray(lengths)[:, np.newaxis]
+    if skip_ids:
+        mask &= ~np.isin(token_ids, skip_ids)
+    return [" ".join(row[row_mask]) for row, row_mask in zip(tokens, mask)]
+
+
+def ctc_greedy_decoder(log_probs_batch, input_lengths, blank_idx=1):
+    """
+    Best-path CTC decoding: argmax per frame, then repeats collapsed and blanks removed.
 
     Args:
         log_probs_batch (Tensor): (B, T, V) log-probs after log-softmax
         input_lengths (Tensor): Lengths for each sequence
-        beam_width (int): Beam size
         blank_idx (int): Index of the blank token
 
     Returns:
         List[List[int]]: Decoded sequences (token indices)
     """
-    B, T, V = log_probs_batch.shape
-    results = []
+    token_ids, lengths = ctc_greedy_decode_batch(log_probs_batch, input_lengths, blank_idx)
+    return [row[:length].tolist() for row, length in zip(token_ids, lengths)]
 
-    for b in range(B):
-        log_probs = log_probs_batch[b][:input_lengths[b]]  # (T_b, V)
-        T_b = log_probs.size(0)
-        beams = [([], 0.0)] # (sequence, score)
 
-        for t in range(T_b):
-            new_beams = defaultdict(lambda: -float("inf"))
+def _prefix_beam_search(log_probs, candidates, beam_width, blank_idx, lm=None, lm_weight=0.5, insertion_bonus=0.0):
+    """
+    CTC prefix beam search over one sequence.
+    Each prefix keeps two scores: paths ending in a blank (p_b) and paths ending in its last
+    token (p_nb), so "A A" (repeat, collapsed) and "A <blank> A" (two tokens) are told apart.
+    Prefixes are nodes of a trie (parent, token) identified by an int, so extending a beam
+    never copies the sequence. Scoring is vectorized over (beams, candidates).
+    With an LM (shallow fusion), every appended token adds lm_weight * log P_lm(token | prefix)
+    + insertion_bonus, and ending the sentence is scored once the last frame is processed.
+
+    Args:
+        log_probs (np.ndarray): (T, V) log-probs, float64
+        candidates (np.ndarray): (T, K) token ids considered at each frame (blank excluded)
+        beam_width (int): Number of prefixes kept after each frame
+        blank_idx (int): Index of the blank token
+        lm: Optional BoundGlossLM (see gloss_lm.py)
+        lm_weight (float): LM weight (alpha)
+        insertion_bonus (float): Bonus per emitted token (beta), offsets the LM's bias towards short outputs
+
+    Returns:
+        List[int]: Best token sequence
+    """
+    neg_inf = -np.inf
+    parents = [-1]   # Trie: node 0 is the empty prefix
+    tokens = [-1]
+    children = {}    # (parent node, token) -> node
+    lm_states = [lm.start_state] if lm is not None else None
+    beam_nodes = np.zeros(1, dtype=np.int64)
+    p_b = np.zeros(1)
+    p_nb = np.full(1, neg_inf)
+
+    for t in range(log_probs.shape[0]):
+        frame = log_probs[t]
+        frame_candidates = candidates[t]
+        last_tokens = np.array([tokens[node] for node in beam_nodes])
+        p_total = np.logaddexp(p_b, p_nb)
+
+        # Prefix unchanged: a blank, or a repeat of the last token (collapsed)
+        stay_b = p_total + frame[blank_idx]
+        stay_nb = p_nb + np.where(last_tokens >= 0, frame[np.maximum(last_tokens, 0)], neg_inf)
+        # Prefix extended by a candidate: after its own last token, only paths ending in a blank count
+        is_repeat = frame_candidates[np.newaxis, :] == last_tokens[:, np.newaxis]
+        extend = np.where(is_repeat, p_b[:, np.newaxis], p_total[:, np.newaxis]) + frame[frame_candidates][np.newaxis, :]
+        if lm is not None:
+            states = np.stack([lm_states[node] for node in beam_nodes])
+            extend = extend + lm_weight * lm.score(states, frame_candidates) + insertion_bonus
+
+        scores = {int(node): [stay_b[w], stay_nb[w]] for w, node in enumerate(beam_nodes)}
+        for w, k in zip(*np.nonzero(extend > neg_inf)):
+            parent, token = int(beam_nodes[w]), int(frame_candidates[k])
+            child = children.get((parent, token))
+            if child is None:
+                child = len(parents)
+                parents.append(parent)
+                tokens.append(token)
+                children[(parent, token)] = child
+                if lm is not None:
+                    lm_states.append(lm.advance(lm_states[parent], token))
+            entry = scores.get(child)
+            if entry is None:
+                scores[child] = [neg_inf, extend[w, k]]
+            else:
+                entry[1] = np.logaddexp(entry[1], extend[w, k])
+
+        nodes = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.array(list(scores.values()))
+        keep = np.argsort(-np.logaddexp(values[:, 0], values[:, 1]), kind="stable")[:beam_width]
+        beam_nodes, p_b, p_nb = nodes[keep], values[keep, 0], values[keep, 1]
+
+    best = 0 # Beams are sorted by score
+    if lm is not None:
+        end_scores = np.logaddexp(p_b, p_nb) + lm_weight * lm.score_end(np.stack([lm_states[node] for node in beam_nodes]))
+        best = int(np.argmax(end_scores))
+
+    # Walk the trie back from the best beam
+    node = int(beam_nodes[best])
+    sequence = []
+    while node > 0:
+        sequence.append(tokens[node])
+        node = parents[node]
+    return sequence[::-1]
 
-            for seq, score in beams:
-                for i in range(V):
-                    new_seq = list(seq)
-                    if i != blank_idx:
-                        if len(seq) == 0 or seq[-1] != i:
-                            new_seq.append(i)
 
-                    new_score = score + log_probs[t, i].item()
-                    new_beams[tuple(new_seq)] = log_sum_exp(new_beams[tuple(new_seq)], new_score)
+def ctc_beam_search_decoder(log_probs_batch, input_lengths, beam_width=3, blank_idx=1, top_k=None,
+                            lm=None, lm_weight=0.5, insertion_bonus=0.0):
+    """
+    CTC prefix beam search decoder.
+    Each frame's vocabulary is pruned to its top_k tokens (plus the blank) with one torch.topk over
+    the whole batch, and the batch is moved to the CPU once. beam_width=1 without an LM is
+    best-path decoding.
 
-            beams = sorted(new_beams.items(), key=lambda x: x[1], reverse=True)[:beam_width]
+    Args:
+        log_probs_batch (Tensor): (B, T, V) log-probs after log-softmax
+        input_lengths (Tensor): Lengths for each sequence
+        beam_width (int): Beam size
+        blank_idx (int): Index of the blank token
+        top_k (int): Tokens considered per frame (default: beam_width)
+        lm: Optional gloss LM bound to this vocabulary (GlossNGramLM.bind), for shallow fusion
+        lm_weight (float): LM weight (alpha)
+        insertion_bonus (float): Bonus per emitted token (beta)
 
-        best_seq, _ = beams[0]
-        best_seq = collapse_repeats_and_remove_blanks(list(best_seq), blank_idx)
-        results.append(best_seq)
+    Returns:
+        List[List[int]]: Decoded sequences (token indices)
+    """
+    if beam_width <= 1 and lm is None:
+        return ctc_greedy_decoder(log_probs_batch, input_lengths, blank_idx)
+
+    B, T, V = log_probs_batch.shape
+    beam_width = max(int(beam_width), 1)
+    top_k = min(top_k or beam_width, V - 1)
+    log_probs_batch = log_probs_batch.detach()
+    # The blank is always scored separately, keep it out of the candidates
+    masked = log_probs_batch.index_fill(-1, torch.tensor([blank_idx], device=log_probs_batch.device), -float("inf"))
+    candidates = torch.topk(masked, top_k, dim=-1).indices.cpu().numpy() # (B, T, K)
+    log_probs_np = log_probs_batch.double().cpu().numpy()
+    lengths = torch.as_tensor(input_lengths).cpu().tolist()
 
-    return results
+    return [
+        _prefix_beam_search(log_probs_np[b, :lengths[b]], candidates[b, :lengths[b]], beam_width, blank_idx,
+                            lm, lm_weight, insertion_bonus)
+        for b in range(B)
+    ]
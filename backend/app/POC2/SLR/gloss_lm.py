@@ -0,0 +1,178 @@
+import argparse
+import math
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+BOS_TOKEN = "<s>"
+EOS_TOKEN = "</s>"
+UNK_TOKEN = "<unk>"
+
+
+class GlossNGramLM:
+    """
+    Compact gloss n-gram language model for CTC shallow fusion.
+    Built from the 'orth' column of the PHOENIX annotations (the same text SimpleTokenizer
+    builds its vocab from), with stupid backoff scores. Each order is stored as two arrays,
+    sorted int64 n-gram keys and float32 log-scores, looked up with np.searchsorted, so a
+    whole (beams x candidates) block is scored in a few array ops.
+    The LM has its own word list: bind() maps it to a decoder vocabulary (V1 or V2).
+    """
+    def __init__(self, words, keys, log_scores, order, backoff=0.4, unk_log_score=None):
+        self.words = list(words)
+        self.word_to_id = {w: i for i, w in enumerate(self.words)}
+        self.keys = keys             # keys[m - 1]: sorted keys of the m-grams
+        self.log_scores = log_scores # log_scores[m - 1]: log S(w | context) of those m-grams
+        self.order = order
+        self.backoff = backoff
+        self.log_backoff = math.log(backoff)
+        self.unk_log_score = unk_log_score if unk_log_score is not None else math.log(1e-6)
+        self.bos_id = self.word_to_id[BOS_TOKEN]
+        self.eos_id = self.word_to_id[EOS_TOKEN]
+        self.unk_id = self.word_to_id[UNK_TOKEN]
+        if len(self.words) ** order >= 2 ** 63:
+            raise ValueError(f"Vocabulary of {len(self.words)} words is too large for {order}-gram int64 keys.")
+
+    @classmethod
+    def build(cls, sentences, order=3, backoff=0.4, min_count=1):
+        """Counts the n-grams of whitespace-tokenized gloss sentences, padded with <s> ... </s>."""
+        word_counts = Counter(token for sentence in sentences for token in sentence.split())
+        words = [BOS_TOKEN, EOS_TOKEN, UNK_TOKEN] + sorted(w for w, c in word_counts.items() if c >= min_count)
+        word_to_id = {w: i for i, w in enumerate(words)}
+        vocab_size = len(words)
+
+        ngram_counts = [Counter() for _ in range(order)]
+        for sentence in sentences:
+            ids = [word_to_id.get(token, word_to_id[UNK_TOKEN]) for token in sentence.split()]
+            padded = [word_to_id[BOS_TOKEN]] * (order - 1) + ids + [word_to_id[EOS_TOKEN]]
+            for position in range(order - 1, len(padded)):
+                for m in range(1, order + 1):
+                    ngram_counts[m - 1][tuple(padded[position - m + 1:position + 1])] += 1
+
+        keys, log_scores = [], []
+        total = sum(ngram_counts[0].values())
+        for m in range(1, order + 1):
+            counts = ngram_counts[m - 1]
+            context_counts = Counter()
+            for ngram, count in counts.items():
+                context_counts[ngram[:-1]] += count
+            ngram_keys = np.array([_ngram_key(ngram, vocab_size) for ngram in counts], dtype=np.int64)
+            scores = np.array([
+                math.log(count / (context_counts[ngram[:-1]] if m > 1 else total)) for ngram, count in counts.items()
+            ], dtype=np.float32)
+            sort = np.argsort(ngram_keys)
+            keys.append(ngram_keys[sort])
+            log_scores.append(scores[sort])
+
+        print(f"Built {order}-gram gloss LM: {vocab_size} words, " +
+              ", ".join(f"{len(k)} {m + 1}-grams" for m, k in enumerate(keys)))
+        return cls(words, keys, log_scores, order, backoff, unk_log_score=math.log(1.0 / (total + vocab_size)))
+
+    @classmethod
+    def from_annotations(cls, annotation_files, order=3, backoff=0.4, min_count=1):
+        """Builds the LM from PHOENIX corpus csv files ('|' separated, 'orth' column)."""
+        sentences = []
+        for annotation_file in annotation_files:
+            df = pd.read_csv(annotation_file, sep="|")
+            sentences.extend(s.strip() for s in df["orth"] if isinstance(s, str) and s.strip())
+        print(f"Read {len(sentences)} gloss sentences from {len(annotation_files)} annotation file(s).")
+        return cls.build(sentences, order=order, backoff=backoff, min_count=min_count)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {"words": np.array(self.words, dtype=object).astype(str),
+                  "params": np.array([self.order, self.backoff, self.unk_log_score], dtype=np.float64)}
+        for m in range(self.order):
+            arrays[f"keys_{m + 1}"] = self.keys[m]
+            arrays[f"log_scores_{m + 1}"] = self.log_scores[m]
+        np.savez(path, **arrays)
+        print(f"Gloss LM saved to {path}")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            order, backoff, unk_log_score = data["params"]
+            order = int(order)
+            keys = [data[f"keys_{m + 1}"] for m in range(order)]
+            log_scores = [data[f"log_scores_{m + 1}"] for m in range(order)]
+            words = data["words"].tolist()
+        print(f"Loaded {order}-gram gloss LM ({len(words)} words) from {path}")
+        return cls(words, keys, log_scores, order, float(backoff), float(unk_log_score))
+
+    def score_ids(self, contexts, word_ids):
+        """
+        Log-scores of LM word ids after LM contexts, with stupid backoff.
+        Args:
+            contexts (np.ndarray): (W, order - 1) LM ids, oldest first.
+            word_ids (np.ndarray): (K,) LM ids.
+        Returns:
+            np.ndarray: (W, K) log-scores.
+        """
+        vocab_size = len(self.words)
+        contexts = np.atleast_2d(np.asarray(contexts, dtype=np.int64))
+        word_ids = np.asarray(word_ids, dtype=np.int64)
+        scores = np.full((len(contexts), len(word_ids)), np.nan)
+        penalty = 0.0
+        for m in range(self.order, 0, -1):
+            context_keys = np.zeros(len(contexts), dtype=np.int64)
+            for column in range(self.order - m, self.order - 1):
+                context_keys = context_keys * vocab_size + contexts[:, column]
+            query = context_keys[:, np.newaxis] * vocab_size + word_ids[np.newaxis, :]
+            table = self.keys[m - 1]
+            positions = np.minimum(np.searchsorted(table, query), max(len(table) - 1, 0))
+            found = np.isnan(scores) & (table[positions] == query) if len(table) else np.zeros(query.shape, dtype=bool)
+            scores[found] = self.log_scores[m - 1][positions[found]] + penalty
+            penalty += self.log_backoff
+        unresolved = np.isnan(scores)
+        scores[unresolved] = self.unk_log_score + penalty
+        return scores
+
+    def bind(self, decoder_tokens):
+        """Returns a scorer for a decoder vocabulary given as a list of tokens (index = decoder id)."""
+        return BoundGlossLM(self, decoder_tokens)
+
+
+class BoundGlossLM:
+    """
+    A GlossNGramLM bound to a decoder vocabulary, as used by ctc_beam_search_decoder.
+    The LM state of a prefix is the array of its last (order - 1) LM ids.
+    """
+    def __init__(self, lm, decoder_tokens):
+        self.lm = lm
+        self.decoder_to_lm = np.array([lm.word_to_id.get(token, lm.unk_id) for token in decoder_tokens], dtype=np.int64)
+        self.start_state = np.full(lm.order - 1, lm.bos_id, dtype=np.int64)
+
+    def advance(self, state, decoder_token):
+        if len(state) == 0: # Unigram LM: no context
+            return state
+        return np.append(state[1:], self.decoder_to_lm[decoder_token])
+
+    def score(self, states, decoder_tokens):
+        """(W, order - 1) states x (K,) decoder token ids -> (W, K) log-scores."""
+        return self.lm.score_ids(states, self.decoder_to_lm[decoder_tokens])
+
+    def score_end(self, states):
+        """(W,) log-scores of ending the sentence after each state."""
+        return self.lm.score_ids(states, np.array([self.lm.eos_id]))[:, 0]
+
+
+def _ngram_key(ngram, vocab_size):
+    key = 0
+    for word_id in ngram:
+        key = key * vocab_size + word_id
+    return key
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the gloss n-gram LM used for CTC shallow fusion.")
+    parser.add_argument("--annotations", nargs="+", required=True, help="PHOENIX corpus csv file(s) with an 'orth' column (train split).")
+    parser.add_argument("--output", default="../checkpoints/gloss_lm.npz")
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.4)
+    parser.add_argument("--min_count", type=int, default=1)
+    args = parser.parse_args()
+
+    lm = GlossNGramLM.from_annotations(args.annotations, order=args.order, backoff=args.backoff, min_count=args.min_count)
+    lm.save(args.output)
@@ -1,5 +1,8 @@
+import torch
 import torch.nn as nn
+from typing import Optional
 import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 class ResidualBlock1D(nn.Module):
     def __init__(self, in_channels, out_channels, kernel_size=3, stride=1, dropout_rate=0.1):
@@ -21,12 +24,22 @@ class ResidualBlock1D(nn.Module):
                 nn.BatchNorm1d(out_channels)
             )
 
-    def forward(self, x):
-        out = self.conv1(x)
+    def fuse_conv_bn(self):
+        """Folds each BatchNorm1d into the preceding conv (eval only); the BN layers become Identity."""
+        self.conv1, self.bn1 = fuse_conv_bn_eval(self.conv1, self.bn1), nn.Identity()
+        self.conv2, self.bn2 = fuse_conv_bn_eval(self.conv2, self.bn2), nn.Identity()
+        if len(self.shortcut) == 2:
+            self.shortcut = nn.Sequential(fuse_conv_bn_eval(self.shortcut[0], self.shortcut[1]))
+        return self
+
+    def forward(self, x, mask: Optional[torch.Tensor] = None):
+        # mask (B, 1, T): zeroes padded frames before each temporal conv, so a padded batch
+        # gives the same outputs on valid frames as each sequence run on its own
+        out = self.conv1(x if mask is None else x * mask)
         out = self.bn1(out)
         out = self.relu(out)
         out = self.dropout(out)
-        out = self.conv2(out)
+        out = self.conv2(out if mask is None else out * mask)
         out = self.bn2(out)
         out += self.shortcut(x)
         out = self.relu(out)
@@ -61,10 +74,28 @@ class Temporal1DEncoderV2(nn.Module):
             self.final_proj = nn.Conv1d(current_dim, out_dim, kernel_size=1)
 
 
-    def forward(self, x):  # x: (B, T, D_in)
+    def fuse_conv_bn(self):
+        """
+        Inference-only: folds every BatchNorm1d into its conv, in the stem and in each ResidualBlock1D.
+        Masking is applied to conv inputs, so a fused encoder still handles padded batches exactly.
+        """
+        assert not self.training, "fuse_conv_bn() must be called on a model in eval mode"
+        self.initial_conv = nn.Sequential(fuse_conv_bn_eval(self.initial_conv[0], self.initial_conv[1]), self.initial_conv[2])
+        for stage in self.stages:
+            for block in stage:
+                block.fuse_conv_bn()
+        return self
+
+    def forward(self, x, lengths: Optional[torch.Tensor] = None):  # x: (B, T, D_in), lengths: optional (B,) valid lengths of a padded batch
+        mask: Optional[torch.Tensor] = None
+        if lengths is not None:
+            mask = (torch.arange(x.size(1), device=x.device).unsqueeze(0) < lengths.to(x.device).unsqueeze(1))
+            mask = mask.unsqueeze(1).to(x.dtype) # (B, 1, T)
         x = x.permute(0, 2, 1)     
-        x = self.initial_conv(x)
-        x = self.stages(x)
+        x = self.initial_conv(x if mask is None else x * mask)
+        for stage in self.stages:
+            for block in stage:
+                x = block(x, mask)
         x = self.final_proj(x)      
         x = x.permute(0, 2, 1)     
         return x
\ No newline at end of file
@@ -1,4 +1,5 @@
 import argparse
+import numpy as np
 import torch
 import torch.nn as nn
 import os
@@ -13,6 +14,7 @@ from linear_ctc_head import LinearCTCHead
 from phoenix_dataset import PhoenixDataset, collate_fn
 from tokenizer import SimpleTokenizer
 from temp_v2 import Temporal1DEncoderV2
+from ctc_decode import ctc_greedy_decode_batch, ids_to_strings
 
 class WarmupScheduler(torch.optim.lr_scheduler._LRScheduler):
     def __init__(self, optimizer, warmup_steps, total_steps, last_epoch=-1):
@@ -36,6 +38,7 @@ def evaluate_model(cnn_encoder, bilstm_encoder, classifier, val_loader, tokenize
     all_pred_decoded_texts = []
     all_target_decoded_texts = []
     processed_batch_count = 0
+    vocab_tokens = [tokenizer.inv_vocab.get(i, "<unk>") for i in range(tokenizer.vocab_size())]
 
     with torch.no_grad():
         for batch_data in val_loader:
@@ -56,20 +59,14 @@ def evaluate_model(cnn_encoder, bilstm_encoder, classifier, val_loader, tokenize
             loss = criterion(log_probs.transpose(0, 1), labels, input_lengths_tensor, label_lengths_tensor)
             total_loss += loss.item()
 
-            pred_batch_ids = torch.argmax(log_probs, dim=-1) 
-            
-            current_target_offset = 0
-            for i in range(inputs.size(0)): 
-                pred_len = input_lengths[i] 
-                single_pred_ids_full = pred_batch_ids[i, :pred_len].tolist()
-                
-                decoded_pred_tokens = [p for j, p in enumerate(single_pred_ids_full) if p != blank_idx and (j == 0 or p != single_pred_ids_full[j-1])]
-                all_pred_decoded_texts.append(tokenizer.decode(decoded_pred_tokens))
+            pred_ids, pred_lengths = ctc_greedy_decode_batch(log_probs, input_lengths_tensor, blank_idx)
+            all_pred_decoded_texts.extend(ids_to_strings(pred_ids, pred_lengths, vocab_tokens))
 
-                target_len = label_lengths[i]
-                single_target_ids = labels[current_target_offset : current_target_offset + target_len].tolist()
-                all_target_decoded_texts.append(tokenizer.decode(single_target_ids))
-                current_target_offset += target_len
+            # Targets are concatenated (CTCLoss layout): pad them to (B, max_label_len) the same way
+            label_lengths_np = label_lengths_tensor.numpy()
+            target_ids = np.full((len(label_lengths_np), int(label_lengths_np.max(initial=0))), -1, dtype=np.int64)
+            target_ids[np.arange(target_ids.shape[1])[np.newaxis, :] < label_lengths_np[:, np.newaxis]] = labels.cpu().numpy()[:label_lengths_np.sum()]
+            all_target_decoded_texts.extend(ids_to_strings(target_ids, label_lengths_np, vocab_tokens))
             
             processed_batch_count += 1
                 
@@ -297,10 +294,9 @@ def train(args):
                             cnn_out_sample = cnn_encoder(x)
                             bilstm_out_sample = bilstm_encoder(cnn_out_sample)
                             out_classifier_sample = classifier(bilstm_out_sample)
-                            pred_ids_raw = torch.argmax(out_classifier_sample, dim=-1).squeeze(0).tolist()
-                            decoded_pred_tokens = [p for j, p in enumerate(pred_ids_raw) if p != blank_idx and (j == 0 or p != pred_ids_raw[j-1])]
+                            pred_ids, pred_lengths = ctc_greedy_decode_batch(out_classifier_sample, [out_classifier_sample.shape[1]], blank_idx)
                             print(f"\n🔍 Sample '{name}' prediction at epoch {epoch}:")
-                            print("Pred:", tokenizer.decode(decoded_pred_tokens))
+                            print("Pred:", tokenizer.decode(pred_ids[0, :pred_lengths[0]].tolist()))
                             print("Target:", tokenizer.decode(true_target.tolist()))
                     else:
                          print(f"\nSample '{name}' at epoch {epoch} has empty features, skipping.")
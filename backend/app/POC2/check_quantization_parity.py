@@ -0,0 +1,93 @@
+"""
+Parity check of the quantized CTC inference mode against fp32 (run from backend/):
+
+    python -m app.POC2.check_quantization_parity --model_path model.pt --features <held-out features> \
+        [--annotations PHOENIX-2014-T.test.corpus.csv] [--fuse_conv_bn]
+
+--features is a packed keypoint corpus (app/pipeline_v2/keypoint_corpus.py), a folder of
+<name>/keypoints.npy sub-folders, or a folder of <name>.npy files, holding the (T, 369) V1
+features (e.g. saved with SAVE_DEBUG_FEATURES). Reports greedy-decode agreement, the WER of the
+quantized outputs against the fp32 ones and, with annotations, the WER of both against the
+reference glosses.
+"""
+import argparse
+import os
+import time
+
+import jiwer
+import numpy as np
+import pandas as pd
+
+from .generate_ctc_predictions import CTCPredictor, DEFAULT_CTC_MODEL_CONFIG, POC2_DIR
+from ..pipeline_v2.keypoint_corpus import KeypointCorpus, META_FILENAME
+
+
+def load_features(path, filename="keypoints.npy"):
+    """Returns [(name, features)] from a packed corpus or a per-video / flat .npy folder."""
+    if os.path.exists(os.path.join(path, META_FILENAME)):
+        return [(name, np.asarray(features, dtype=np.float32)) for name, features in KeypointCorpus(path)]
+    samples = []
+    for entry in sorted(os.listdir(path)):
+        full_path = os.path.join(path, entry)
+        if os.path.isdir(full_path) and os.path.exists(os.path.join(full_path, filename)):
+            samples.append((entry, np.load(os.path.join(full_path, filename))))
+        elif entry.endswith(".npy"):
+            samples.append((entry[:-len(".npy")], np.load(full_path)))
+    return samples
+
+
+def safe_wer(references, hypotheses):
+    """WER over the pairs with a non-empty reference (jiwer rejects empty references)."""
+    pairs = [(r, h) for r, h in zip(references, hypotheses) if r.strip()]
+    if not pairs:
+        return float('nan')
+    return jiwer.wer([r for r, _ in pairs], [h for _, h in pairs])
+
+
+def run(predictor, samples):
+    predictions = []
+    start = time.perf_counter()
+    for _, features in samples:
+        predictions.append(predictor.predict_features(features))
+    elapsed_ms = 1000.0 * (time.perf_counter() - start) / max(len(samples), 1)
+    return predictions, elapsed_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the int8 CTC inference mode with fp32 on held-out features.")
+    parser.add_argument("--model_path", required=True, help="CTC checkpoint (POC2/checkpoints/model.pt on the HF repo).")
+    parser.add_argument("--vocab_path", default=os.path.join(POC2_DIR, "checkpoints/vocab.json"))
+    parser.add_argument("--features", required=True, help="Packed corpus or folder of .npy features.")
+    parser.add_argument("--filename", default="keypoints.npy", help="Per-video file name in a per-video layout.")
+    parser.add_argument("--annotations", help="Optional PHOENIX corpus csv ('|' separated, 'name' and 'orth').")
+    parser.add_argument("--fuse_conv_bn", action="store_true", help="Also fold BN into the CNN convs.")
+    args = parser.parse_args()
+
+    samples = load_features(args.features, args.filename)
+    print(f"Loaded {len(samples)} feature sequences from {args.features}")
+
+    fp32 = CTCPredictor(args.model_path, args.vocab_path, DEFAULT_CTC_MODEL_CONFIG)
+    int8 = CTCPredictor(args.model_path, args.vocab_path, DEFAULT_CTC_MODEL_CONFIG,
+                        quantize=True, fuse_conv_bn=args.fuse_conv_bn)
+
+    fp32_predictions, fp32_ms = run(fp32, samples)
+    int8_predictions, int8_ms = run(int8, samples)
+
+    agreement = np.mean([a == b for a, b in zip(fp32_predictions, int8_predictions)]) if samples else float('nan')
+    print("-" * 40)
+    print(f"Samples:                    {len(samples)}")
+    print(f"Greedy-decode agreement:    {100 * agreement:.2f}%")
+    print(f"WER int8 vs fp32 outputs:   {100 * safe_wer(fp32_predictions, int8_predictions):.2f}")
+    print(f"Latency per sample (fp32):  {fp32_ms:.1f} ms")
+    print(f"Latency per sample (int8):  {int8_ms:.1f} ms  (x{fp32_ms / max(int8_ms, 1e-9):.2f})")
+
+    if args.annotations:
+        references = pd.read_csv(args.annotations, sep="|").set_index("name")["orth"].to_dict()
+        scored = [i for i, (name, _) in enumerate(samples) if isinstance(references.get(name), str)]
+        gold = [references[samples[i][0]] for i in scored]
+        wer_fp32 = safe_wer(gold, [fp32_predictions[i] for i in scored])
+        wer_int8 = safe_wer(gold, [int8_predictions[i] for i in scored])
+        print(f"Reference WER (fp32):       {100 * wer_fp32:.2f}  ({len(scored)} annotated samples)")
+        print(f"Reference WER (int8):       {100 * wer_int8:.2f}")
+        print(f"WER delta (int8 - fp32):    {100 * (wer_int8 - wer_fp32):+.2f}")
+    print("-" * 40)
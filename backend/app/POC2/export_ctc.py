@@ -0,0 +1,111 @@
+"""
+Inference export of the V1 temporal CNN (Temporal1DEncoderV2) for CTCPredictor.
+
+The export folds every BatchNorm1d into its conv, replaces the dropout layers by Identity
+and compiles the result with torch.jit.script + torch.jit.freeze. The frozen module is
+cached on disk under a key derived from the checkpoint sha256, so a restart only loads it.
+Pre-build the artifact (e.g. in the Docker image) from backend/:
+
+    python -m app.POC2.export_ctc --model_path app/POC2/checkpoints/model.pt
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+
+import torch
+import torch.nn as nn
+
+from .SLR.temp_v2 import Temporal1DEncoderV2
+from ..artifact_store import file_sha256
+
+# Bump when the export steps change, so older cached artifacts are rebuilt
+EXPORT_FORMAT_VERSION = 1
+
+
+def strip_dropout(module):
+    """Replaces every nn.Dropout of the module tree by nn.Identity (a no-op in eval anyway)."""
+    for name, child in module.named_children():
+        if isinstance(child, nn.Dropout):
+            setattr(module, name, nn.Identity())
+        else:
+            strip_dropout(child)
+    return module
+
+
+def export_cnn_encoder(cnn_encoder):
+    """
+    Returns a frozen TorchScript copy of an eval-mode Temporal1DEncoderV2 (BN folded, no dropout).
+    The scripted module keeps the optional `lengths` argument, so padded batches are still masked.
+    """
+    encoder = copy.deepcopy(cnn_encoder).eval()
+    encoder.fuse_conv_bn()
+    strip_dropout(encoder)
+    return torch.jit.freeze(torch.jit.script(encoder))
+
+
+def export_cache_key(model_path, config, device):
+    """Checkpoint content + CNN architecture + torch version + device: any change rebuilds the artifact."""
+    # An artifact-store folder (app/artifact_store.py) is already named after its checkpoint sha256
+    checkpoint_hash = os.path.basename(os.path.normpath(model_path)) if os.path.isdir(model_path) else file_sha256(model_path)
+    architecture = {k: config[k] for k in ('input_dim', 'cnn_block_dims', 'cnn_output_dim', 'cnn_kernel_size', 'cnn_num_blocks')}
+    fingerprint = json.dumps({
+        'checkpoint_sha256': checkpoint_hash,
+        'architecture': architecture,
+        'torch': torch.__version__,
+        'device': torch.device(device).type,
+        'format': EXPORT_FORMAT_VERSION,
+    }, sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+
+def load_or_export_cnn_encoder(cnn_encoder, model_path, config, cache_dir, device):
+    """
+    Loads the cached TorchScript CNN of this checkpoint, or exports it from the loaded
+    `cnn_encoder` and writes it to `cache_dir` (atomically, so concurrent workers never read
+    a partial file). Returns the scripted module.
+    """
+    artifact_path = os.path.join(cache_dir, f"ctc_cnn_{export_cache_key(model_path, config, device)}.ts.pt")
+    if os.path.exists(artifact_path):
+        try:
+            scripted = torch.jit.load(artifact_path, map_location=device)
+            print(f"✅ Loaded exported CTC CNN from {artifact_path}")
+            return scripted
+        except Exception as e:
+            print(f"⚠️ Cached CTC CNN {artifact_path} is unreadable ({e}), exporting it again.")
+
+    scripted = export_cnn_encoder(cnn_encoder)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{artifact_path}.{os.getpid()}.tmp"
+        torch.jit.save(scripted, tmp_path)
+        os.replace(tmp_path, artifact_path)
+        print(f"✅ Exported CTC CNN (BN folded, dropout stripped, frozen TorchScript) to {artifact_path}")
+    except OSError as e:
+        print(f"⚠️ Could not cache the exported CTC CNN in {cache_dir}: {e}")
+    return scripted
+
+
+if __name__ == "__main__":
+    from .generate_ctc_predictions import DEFAULT_CTC_MODEL_CONFIG, APP_DIR
+
+    parser = argparse.ArgumentParser(description="Export the V1 CTC temporal CNN to a cached frozen TorchScript module.")
+    parser.add_argument("--model_path", required=True, help="CTC checkpoint (POC2/checkpoints/model.pt on the HF repo).")
+    parser.add_argument("--cache_dir", default=os.path.join(os.path.dirname(APP_DIR), 'instance', 'model_cache'))
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    config = DEFAULT_CTC_MODEL_CONFIG
+    encoder = Temporal1DEncoderV2(
+        input_dim=config['input_dim'],
+        block_dims=config['cnn_block_dims'],
+        out_dim=config['cnn_output_dim'],
+        kernel_size=config['cnn_kernel_size'],
+        num_blocks_per_stage=config['cnn_num_blocks'],
+        dropout_rate=config['cnn_dropout_rate']
+    ).to(args.device)
+    checkpoint = torch.load(args.model_path, map_location=args.device)
+    encoder.load_state_dict(checkpoint["cnn_encoder_state_dict"])
+    encoder.eval()
+    load_or_export_cnn_encoder(encoder, args.model_path, config, args.cache_dir, args.device)
@@ -1,4 +1,5 @@
 import torch
+import torch.nn as nn
 import os
 import numpy as np
 from .SLR.bilstm_encoder import BiLSTMEncoder 
@@ -6,17 +7,32 @@ from .SLR.linear_ctc_head import LinearCTCHead
 from .SLR.tokenizer import SimpleTokenizer 
 from .SLR.temp_v2 import Temporal1DEncoderV2
 from torch.nn.functional import log_softmax
-from .SLR.ctc_decode import ctc_beam_search_decoder 
+from torch.nn.utils.rnn import pad_sequence
+from .SLR.ctc_decode import ctc_beam_search_decoder, ctc_greedy_decode_batch, ids_to_strings
+from .SLR.gloss_lm import GlossNGramLM
+from .export_ctc import load_or_export_cnn_encoder
+from ..batching import DynamicBatcher
+from ..artifact_store import load_artifact
 
 APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 POC2_DIR = os.path.join(APP_DIR, 'POC2')
 
+# Architecture of the production CTC checkpoint (POC2/checkpoints/model.pt)
+DEFAULT_CTC_MODEL_CONFIG = {
+    'input_dim': 369,
+    'cnn_output_dim': 512, 'lstm_hidden_dim': 384, 'num_encoder_layers': 3,
+    'cnn_block_dims': [128, 256, 512], 'cnn_num_blocks': [2, 2, 2],
+    'cnn_kernel_size': 5, 'cnn_dropout_rate': 0.2, 'bilstm_dropout': 0.4,
+}
+
 class CTCPredictor:
     """
     A class to hold pre-loaded models and tokenizer for CTC prediction,
     avoiding reloading them on every call.
     """
-    def __init__(self, model_path, vocab_path, config):
+    def __init__(self, model_path, vocab_path, config, lm_path=None, lm_weight=0.5, insertion_bonus=0.0,
+                 batch_max_size=1, batch_max_wait_ms=10.0, quantize=False, fuse_conv_bn=False,
+                 torchscript=False, export_cache_dir=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"🚀 Initializing CTCPredictor on device: {self.device}")
 
@@ -26,11 +42,17 @@ class CTCPredictor:
         self.tokenizer = SimpleTokenizer()
         self.tokenizer.load_vocab(vocab_path)
         print(f"Loaded vocab with {self.tokenizer.vocab_size()} tokens.")
+        # Token string of each id, for the vectorized greedy decoding
+        self.vocab_tokens = [self.tokenizer.inv_vocab.get(i, "<unk>") for i in range(self.tokenizer.vocab_size())]
 
         # 2. Load Models
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model checkpoint not found at {model_path}")
-        checkpoint = torch.load(model_path, map_location=self.device)
+        if os.path.isdir(model_path):
+            # Artifact-store folder: weights-only safetensors
+            checkpoint, _ = load_artifact(model_path, self.device)
+        else:
+            checkpoint = torch.load(model_path, map_location=self.device)
 
         self.cnn_encoder = Temporal1DEncoderV2(
             input_dim=config['input_dim'],
@@ -65,44 +87,113 @@ class CTCPredictor:
         self.classifier.eval()
         print("✅ CTC models loaded and set to evaluation mode.")
 
+        # 4b. Optional CPU inference optimizations
+        if torchscript:
+            # Frozen TorchScript CNN (BN folded, dropout stripped), cached by checkpoint hash
+            cache_dir = export_cache_dir or os.path.join(os.path.dirname(APP_DIR), 'instance', 'model_cache')
+            self.cnn_encoder = load_or_export_cnn_encoder(self.cnn_encoder, model_path, config, cache_dir, self.device)
+        elif fuse_conv_bn:
+            self.cnn_encoder.fuse_conv_bn()
+            print("✅ Conv/BN fused in the temporal CNN.")
+        self.quantized = False
+        if quantize:
+            if self.device.type != "cpu":
+                print(f"⚠️ Dynamic int8 quantization only runs on CPU, keeping fp32 on {self.device}.")
+            else:
+                # Weights stored in int8, activations quantized on the fly: LSTM and Linear layers only
+                self.bilstm_encoder = torch.ao.quantization.quantize_dynamic(self.bilstm_encoder, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+                self.classifier = torch.ao.quantization.quantize_dynamic(self.classifier, {nn.Linear}, dtype=torch.qint8)
+                self.quantized = True
+                print("✅ BiLSTM and CTC head quantized to dynamic int8.")
+
+        # 5. Optional gloss LM for shallow fusion in the beam search
+        self.lm = None
+        self.lm_weight = lm_weight
+        self.insertion_bonus = insertion_bonus
+        if lm_path:
+            self.lm = GlossNGramLM.load(lm_path).bind(self.vocab_tokens)
+            print(f"✅ Gloss LM enabled (weight {lm_weight}, insertion bonus {insertion_bonus}).")
+
+        # 6. Optional cross-request micro-batching: concurrent predictions share one forward pass
+        self.batcher = None
+        if batch_max_size > 1:
+            self.batcher = DynamicBatcher(self._forward_batch, max_batch_size=batch_max_size,
+                                          max_wait_ms=batch_max_wait_ms, name='ctc-batcher')
+            print(f"✅ CTC micro-batching enabled (up to {batch_max_size} sequences / {batch_max_wait_ms} ms).")
+
     @torch.no_grad()
+    def _forward_batch(self, features_list):
+        """
+        Runs CNN -> BiLSTM -> CTC head once on several (T_i, input_dim) sequences.
+        They are zero-padded to the longest one; the CNN masks the padded frames and the BiLSTM
+        reads a packed sequence, so each output equals the output of a forward on its own.
+        Returns:
+            list[Tensor]: (T_i, vocab_size) log-probs of each sequence.
+        """
+        lengths = torch.tensor([len(f) for f in features_list])
+        padded = pad_sequence(list(features_list), batch_first=True).to(self.device)
+        # A single sequence (or equal lengths) needs no masking/packing
+        lengths_arg = None if bool((lengths == lengths[0]).all()) else lengths
+
+        cnn_out = self.cnn_encoder(padded, lengths=lengths_arg)
+        bilstm_out = self.bilstm_encoder(cnn_out, lengths=lengths_arg)
+        logits = self.classifier(bilstm_out)
+        log_probs = log_softmax(logits, dim=-1)
+        return [log_probs[i, :length] for i, length in enumerate(lengths.tolist())]
+
     def predict(self, features_path, beam_width=1):
         """
         Generates a gloss prediction for a single feature file.
+        Thin wrapper around predict_features, kept for the offline scripts.
         Args:
             features_path (str): Path to the .npy file containing keypoint features.
             beam_width (int): The beam width for the CTC beam search decoder.
         Returns:
             str: The predicted gloss sequence.
         """
-        # Load features
-        loaded_features = np.load(features_path)
-        features = torch.tensor(loaded_features, dtype=torch.float32).unsqueeze(0).to(self.device)
+        return self.predict_features(np.load(features_path), beam_width=beam_width)
 
-        # Forward pass
-        cnn_out = self.cnn_encoder(features)
-        bilstm_out = self.bilstm_encoder(cnn_out)
-        logits = self.classifier(bilstm_out)
-        log_probs = log_softmax(logits, dim=-1)
+    @torch.no_grad()
+    def predict_features(self, features, beam_width=1):
+        """
+        Generates a gloss prediction for features already in memory.
+        Args:
+            features (np.ndarray | torch.Tensor): (T, input_dim) keypoint features of one video.
+            beam_width (int): The beam width for the CTC beam search decoder.
+        Returns:
+            str: The predicted gloss sequence.
+        """
+        features = torch.as_tensor(features, dtype=torch.float32)
+        if features.dim() == 3:
+            features = features.squeeze(0) # (T, input_dim)
+
+        # Forward pass (through the micro-batcher when enabled)
+        if self.batcher is not None:
+            log_probs = self.batcher(features)
+        else:
+            log_probs = self._forward_batch([features])[0]
+        log_probs = log_probs.unsqueeze(0) # (1, T, vocab_size)
 
         # Decode
         input_lengths = torch.tensor([log_probs.shape[1]], device=self.device)
         blank_idx = self.tokenizer.get_blank_idx()
         
-        if beam_width > 1 and ctc_beam_search_decoder is not None:
+        if (beam_width > 1 or self.lm is not None) and ctc_beam_search_decoder is not None:
             pred_ids_batch = ctc_beam_search_decoder(
                 log_probs_batch=log_probs,
                 input_lengths=input_lengths,
                 beam_width=beam_width,
-                blank_idx=blank_idx
+                blank_idx=blank_idx,
+                lm=self.lm,
+                lm_weight=self.lm_weight,
+                insertion_bonus=self.insertion_bonus
             )
             pred_tokens = pred_ids_batch[0]
+            pred_tokens_filtered = [t for t in pred_tokens if t != self.tokenizer.get_pad_idx()]
+            pred_text = self.tokenizer.decode(pred_tokens_filtered)
         else:
-            pred_ids = torch.argmax(log_probs, dim=-1).squeeze(0).tolist()
-            pred_tokens = [p for j, p in enumerate(pred_ids) if p != blank_idx and (j == 0 or p != pred_ids[j - 1])]
-
-        pred_tokens_filtered = [t for t in pred_tokens if t != self.tokenizer.get_pad_idx()]
-        pred_text = self.tokenizer.decode(pred_tokens_filtered)
+            pred_ids, pred_lengths = ctc_greedy_decode_batch(log_probs, input_lengths, blank_idx)
+            pred_text = ids_to_strings(pred_ids, pred_lengths, self.vocab_tokens, skip_ids=[self.tokenizer.get_pad_idx()])[0]
         
         return pred_text
     
@@ -125,17 +216,13 @@ def generate_ctc_predictions(
     
     # Initialize the predictor on the first call
     if PREDICTOR_INSTANCE is None:
-        model_config = {
-            'input_dim': input_dim,
-            'cnn_output_dim': cnn_output_dim,
-            'lstm_hidden_dim': lstm_hidden_dim,
-            'num_encoder_layers': num_encoder_layers,
-            'cnn_block_dims': [128, 256, 512],
-            'cnn_num_blocks': [2, 2, 2],
-            'cnn_kernel_size': 5,
-            'cnn_dropout_rate': 0.2,
-            'bilstm_dropout': 0.4,
-        }
+        model_config = dict(
+            DEFAULT_CTC_MODEL_CONFIG,
+            input_dim=input_dim,
+            cnn_output_dim=cnn_output_dim,
+            lstm_hidden_dim=lstm_hidden_dim,
+            num_encoder_layers=num_encoder_layers,
+        )
         PREDICTOR_INSTANCE = CTCPredictor(
             model_path=model_path,
             vocab_path=os.path.join(POC2_DIR, "checkpoints/vocab.json"),
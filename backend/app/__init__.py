@@ -39,19 +39,16 @@ def create_app(config_class=Config):
     app.register_blueprint(storage_bp, url_prefix='/translation')
 
     with app.app_context():
-        from . import ai_pipeline
-        from .pipeline_v2 import pipeline_v2_orchestrator # New import
+        from . import ai_pipeline # Registers the V1 models (and NLLB)
+        from .pipeline_v2 import pipeline_v2_orchestrator # Registers the V2 models
 
-        print("Loading Pipeline V1 models...")
-        ai_pipeline.load_models()
-        print("Pipeline V1 models loaded.")
+        from .model_registry import REGISTRY
 
-        print("Loading Pipeline V2 models...")
-        pipeline_v2_orchestrator.load_v2_models() # Load V2 models
-        print("Pipeline V2 models loaded.")
-
-        # Une fois que tous les modèles sont chargés, met à jour le statut
-        print("All AI models are now ready.")
+        # Les modèles sont chargés à la première utilisation de leur pipeline ;
+        # seuls les pipelines de PRELOAD_PIPELINES sont chargés au démarrage, en parallèle
+        # puis avec une inférence de warm-up (voir /health pour les temps de chargement).
+        REGISTRY.preload(app.config['PRELOAD_PIPELINES'], max_workers=app.config['PRELOAD_WORKERS'],
+                         warmup=app.config['PRELOAD_WARMUP'])
 
     @app.route('/hello')
     def hello():
@@ -1,24 +1,25 @@
 # backend/app/ai_pipeline.py
 import os
-import glob
 import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-from mmpose.apis import inference_topdown, init_model
-from mmpose.structures import merge_data_samples
+from mmpose.apis import init_model
+from mmdet.apis import init_detector, inference_detector
 from huggingface_hub import hf_hub_download
 
-from .POC2.generate_ctc_predictions import CTCPredictor
-from .POC2.translate_glosses import GlossTranslator
+from .POC2.generate_ctc_predictions import CTCPredictor, DEFAULT_CTC_MODEL_CONFIG
+from .POC2.translate_glosses import GlossTranslator, TASK_PREFIX
+from .pose_extraction import BatchedPoseExtractor, PersonBoxTracker, normalize_keypoint_sequence
+from .translation_cache import TranslationCache, hf_model_id
+from .generation import BatchedGenerator
+from .model_registry import REGISTRY
+from .artifact_store import ArtifactStore, load_artifact
+from .errors import TaskCancelledError
+from config import Config
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__)) 
 POC2_DIR = os.path.join(APP_DIR, 'POC2')
-model_name = "facebook/nllb-200-distilled-600M"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-
-class TaskCancelledError(Exception):
-    pass
+NLLB_MODEL_NAME = "facebook/nllb-200-distilled-600M"
 
 # Dictionnaire de correspondance des langues (codes ISO NLLB)
 lang_codes = {"fr": "fra_Latn","en": "eng_Latn","de": "deu_Latn","es": "spa_Latn"}
@@ -32,42 +33,82 @@ targetLangMapping = {
 # Dictionary to hold pre-loaded models
 MODELS = {}
 
+# Decoding params of GlossTranslator.translate, part of the translation cache key
+GLOSS_TRANSLATION_PARAMS = {"max_length": 128, "num_beams": 5}
+
 # L'identifiant de votre dépôt sur Hugging Face
 HF_REPO_ID = "pgravejal-innov/sign-language-translator-models"
 
-def load_models():
-    """Load all AI models into memory only once."""
-    print("Pre-loading AI models from Hugging Face...")
-    device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+# Copie locale des checkpoints du Hub en safetensors : plus de téléchargement ni de torch.load complet au démarrage
+artifact_store = ArtifactStore(Config.ARTIFACT_STORE_DIR, HF_REPO_ID, check_updates=Config.ARTIFACT_STORE_CHECK_UPDATES)
+
+def fetch_checkpoint(filename):
+    """Local path of a hub checkpoint: its artifact-store folder, or the downloaded file when the store is off."""
+    if Config.ARTIFACT_STORE_ENABLED:
+        return artifact_store.fetch(filename)
+    print(f"Downloading {filename} from {HF_REPO_ID}...")
+    return hf_hub_download(repo_id=HF_REPO_ID, filename=filename)
+
+def fetch_file(filename):
+    """Local path of a (non-checkpoint) hub file, from the artifact store when it is enabled."""
+    if Config.ARTIFACT_STORE_ENABLED:
+        return artifact_store.fetch_file(filename)
+    print(f"Downloading {filename} from {HF_REPO_ID}...")
+    return hf_hub_download(repo_id=HF_REPO_ID, filename=filename)
 
-    # 1. Keypoint Extraction Model (MMPose)
+def load_mm_artifact(model, artifact_dir, device):
+    """
+    Loads an artifact-store folder into an mmpose / mmdet model built without weights.
+    Strict: a missing or unexpected key raises instead of serving randomly initialised layers.
+    assign=True: the loaded tensors become the parameters, instead of being copied into the random ones.
+    """
+    groups, metadata = load_artifact(artifact_dir, device)
+    model.load_state_dict(groups['state_dict'], strict=True, assign=True)
+    dataset_meta = metadata.get('meta', {}).get('dataset_meta') if isinstance(metadata.get('meta'), dict) else None
+    if dataset_meta:
+        model.dataset_meta = dataset_meta # Same priority as init_model / init_detector: checkpoint > config
+    return model
+
+def load_pose_extractor():
+    """Keypoint Extraction Model (MMPose RTMPose-L)."""
+    device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
     # Les fichiers de config peuvent rester dans le code Git, car ils sont petits.
     config_path = os.path.join(POC2_DIR, 'MMPose/config/wholebody/rtmpose-l_8xb32-270e_coco-ubody-wholebody-384x288.py')
     
-    # On télécharge le checkpoint
-    print(f"Downloading MMPose checkpoint from {HF_REPO_ID}...")
-    checkpoint_path_mmpose = hf_hub_download(
-        repo_id=HF_REPO_ID,
-        filename="POC2/MMPose/checkpoint/wholebody/rtmpose-l_simcc-ucoco_dw-ucoco_270e-384x288-2438fd99_20230728.pth"
+    # On récupère le checkpoint (artifact store local, ou téléchargement)
+    checkpoint_path_mmpose = fetch_checkpoint(
+        "POC2/MMPose/checkpoint/wholebody/rtmpose-l_simcc-ucoco_dw-ucoco_270e-384x288-2438fd99_20230728.pth"
     )
     
-    MODELS['keypoint_extractor'] = init_model(config_path, checkpoint_path_mmpose, device=device)
+    if os.path.isdir(checkpoint_path_mmpose):
+        # Safetensors artifact: build the model without weights, then load them
+        MODELS['keypoint_extractor'] = load_mm_artifact(init_model(config_path, None, device=device), checkpoint_path_mmpose, device)
+    else:
+        MODELS['keypoint_extractor'] = init_model(config_path, checkpoint_path_mmpose, device=device)
+    MODELS['pose_extractor'] = BatchedPoseExtractor(MODELS['keypoint_extractor'], batch_size=Config.POSE_BATCH_SIZE)
     print("Keypoint extractor loaded.")
 
-    # 2. CTC Predictor
-    ctc_model_config = {
-        'input_dim': 369,
-        'cnn_output_dim': 512, 'lstm_hidden_dim': 384, 'num_encoder_layers': 3,
-        'cnn_block_dims': [128, 256, 512], 'cnn_num_blocks': [2, 2, 2],
-        'cnn_kernel_size': 5, 'cnn_dropout_rate': 0.2, 'bilstm_dropout': 0.4,
-    }
 
-    # On télécharge le checkpoint CTC
-    print(f"Downloading CTC model checkpoint from {HF_REPO_ID}...")
-    ctc_model_path = hf_hub_download(
-        repo_id=HF_REPO_ID,
-        filename="POC2/checkpoints/model.pt"
-    )
+def load_person_detector():
+    """Person detector (RTMDet-nano) for the detect-then-track pose boxes."""
+    device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+    det_config_path = os.path.join(POC2_DIR, 'MMPose/config/det/rtmdet_nano_320-8xb32_coco-person.py')
+    det_checkpoint = Config.POSE_DET_CHECKPOINT
+    if Config.ARTIFACT_STORE_ENABLED and det_checkpoint.startswith(('http://', 'https://')):
+        det_checkpoint = artifact_store.fetch_url(det_checkpoint) # Downloaded once, then read offline
+    if os.path.isdir(det_checkpoint):
+        MODELS['person_detector'] = load_mm_artifact(init_detector(det_config_path, None, device=device), det_checkpoint, device)
+    else:
+        MODELS['person_detector'] = init_detector(det_config_path, det_checkpoint, device=device)
+    print("Person detector loaded.")
+
+
+def load_ctc_predictor():
+    """CTC Predictor (temporal CNN + BiLSTM + CTC head)."""
+    ctc_model_config = dict(DEFAULT_CTC_MODEL_CONFIG)
+
+    # On récupère le checkpoint CTC (artifact store local, ou téléchargement)
+    ctc_model_path = fetch_checkpoint("POC2/checkpoints/model.pt")
 
     # Le vocabulaire peut aussi être sur le Hub, ou rester local s'il est petit.
     # Pour l'exemple, on le laisse local, mais vous pourriez le télécharger aussi.
@@ -76,11 +117,22 @@ def load_models():
     MODELS['ctc_predictor'] = CTCPredictor(
         model_path=ctc_model_path,
         vocab_path=ctc_vocab_path, # Gardé en local pour l'instant
-        config=ctc_model_config
+        config=ctc_model_config,
+        lm_path=Config.CTC_LM_PATH, # Optional gloss LM (shallow fusion)
+        lm_weight=Config.CTC_LM_WEIGHT,
+        insertion_bonus=Config.CTC_LM_INSERTION_BONUS,
+        batch_max_size=Config.CTC_BATCH_MAX_SIZE, # Cross-request micro-batching
+        batch_max_wait_ms=Config.CTC_BATCH_MAX_WAIT_MS,
+        quantize=Config.CTC_QUANTIZE, # CPU-only dynamic int8 (see POC2/check_quantization_parity.py)
+        fuse_conv_bn=Config.CTC_FUSE_CONV_BN,
+        torchscript=Config.CTC_TORCHSCRIPT, # Cached frozen TorchScript CNN (see POC2/export_ctc.py)
+        export_cache_dir=Config.CTC_EXPORT_CACHE_DIR
     )
     print("CTC Predictor loaded.")
 
-    # 3. Gloss Translator (flan_model)
+
+def load_gloss_translator():
+    """Gloss Translator (flan_model), with its translation cache and batched generator."""
     # Pour les modèles de type transformers, on peut directement passer le repo_id !
     # C'est la méthode la plus simple.
     print(f"Loading Gloss Translator model from {HF_REPO_ID}...")
@@ -89,70 +141,118 @@ def load_models():
     # ou alors on spécifie le sous-dossier comme ceci:
     # MODELS['gloss_translator'] = GlossTranslator(model_dir=flan_model_repo_path, subfolder="POC2/flan_model")
     # Modifions GlossTranslator pour qu'il gère ça.
-    MODELS['gloss_translator'] = GlossTranslator(model_dir=flan_model_repo_path, subfolder="POC2/flan_model")
+    translator = GlossTranslator(model_dir=flan_model_repo_path, subfolder="POC2/flan_model")
+    MODELS['gloss_translation_cache'] = TranslationCache(
+        'gloss_translator', hf_model_id(translator.model, extra="POC2/flan_model"),
+        Config.TRANSLATION_CACHE_SIZE, Config.TRANSLATION_CACHE_DB
+    )
+    MODELS['gloss_generator'] = BatchedGenerator(
+        translator.model, translator.tokenizer, translator.device,
+        Config.SEQ2SEQ_BATCH_MAX_SIZE, Config.SEQ2SEQ_BATCH_MAX_WAIT_MS,
+        max_input_length=translator.tokenizer.model_max_length, name='gloss-translator'
+    )
+    MODELS['gloss_translator'] = translator
     print("Gloss Translator loaded.")
 
 
-def run_translation_pipeline(video_frames_dir: str, task_temp_dir: str, targetLang: str, cancellation_check: callable) -> dict:
+def load_text_translator():
+    """NLLB (German -> target language), shared by V1 and V2."""
+    print(f"Loading text translation model {NLLB_MODEL_NAME}...")
+    tokenizer = AutoTokenizer.from_pretrained(NLLB_MODEL_NAME)
+    model = AutoModelForSeq2SeqLM.from_pretrained(NLLB_MODEL_NAME)
+    model.eval()
+    # Cache des traductions NLLB (LRU en mémoire + SQLite), invalidé quand le checkpoint change
+    MODELS['text_translation_cache'] = TranslationCache('nllb', hf_model_id(model), Config.TRANSLATION_CACHE_SIZE, Config.TRANSLATION_CACHE_DB)
+    # Les appels NLLB concurrents partagent un generate() (micro-batching)
+    MODELS['text_generator'] = BatchedGenerator(model, tokenizer, model.device, Config.SEQ2SEQ_BATCH_MAX_SIZE,
+                                                Config.SEQ2SEQ_BATCH_MAX_WAIT_MS, name='nllb')
+    MODELS['text_tokenizer'] = tokenizer
+    MODELS['text_model'] = model
+    print("Text translation model loaded.")
+
+
+# Synthetic warm-up inferences, run once after a preload (they bypass the translation caches)
+def warm_up_pose_extractor():
+    MODELS['pose_extractor'].extract([np.zeros((480, 640, 3), dtype=np.uint8)])
+
+
+def warm_up_person_detector():
+    inference_detector(MODELS['person_detector'], np.zeros((480, 640, 3), dtype=np.uint8))
+
+
+def warm_up_ctc_predictor():
+    MODELS['ctc_predictor'].predict_features(np.zeros((64, DEFAULT_CTC_MODEL_CONFIG['input_dim']), dtype=np.float32))
+
+
+def warm_up_gloss_translator():
+    MODELS['gloss_generator'](TASK_PREFIX + "HEUTE WETTER", early_stopping=True, **GLOSS_TRANSLATION_PARAMS)
+
+
+def warm_up_text_translator():
+    MODELS['text_generator']("Heute ist das Wetter schön.", forced_bos_token_id=MODELS['text_tokenizer'].convert_tokens_to_ids(lang_codes["en"]))
+
+
+# Models are loaded on first use by their pipeline (or at startup with Config.PRELOAD_PIPELINES)
+REGISTRY.register('pose_extractor', load_pose_extractor, pipelines=('v1',), warmup=warm_up_pose_extractor)
+if Config.POSE_PERSON_TRACKING:
+    # mmpose and mmdet both switch the global mmengine default scope while building a model: never in parallel
+    REGISTRY.register('person_detector', load_person_detector, pipelines=('v1',), depends_on=('pose_extractor',),
+                      warmup=warm_up_person_detector)
+REGISTRY.register('ctc_predictor', load_ctc_predictor, pipelines=('v1',), warmup=warm_up_ctc_predictor)
+REGISTRY.register('gloss_translator', load_gloss_translator, pipelines=('v1',), warmup=warm_up_gloss_translator)
+# NLLB is in no pipeline: text_translation() loads it on the first non-German request (name it in PRELOAD_PIPELINES to preload it)
+REGISTRY.register('text_translator', load_text_translator, warmup=warm_up_text_translator)
+
+
+def load_models():
+    """Load all Pipeline V1 models into memory only once."""
+    REGISTRY.load_pipeline('v1')
+
+
+def run_translation_pipeline(frames, task_temp_dir: str, targetLang: str, cancellation_check: callable) -> dict:
     """
     Runs the complete pipeline on a sequence of frames.
     Args:
-        video_frames_dir: The folder containing the extracted video frames.
+        frames: Iterable of decoded BGR frames (np.ndarray), e.g. frame_source.iter_video_frames().
         task_temp_dir: The unique folder for this task to store intermediate files.
     Returns:
         The translated sentence as text.
     """
-    print(f"1. Extracting keypoints from frames in {video_frames_dir}")
-    keypoints_output_file = os.path.join(task_temp_dir, 'keypoints.npy')
+    REGISTRY.load_pipeline('v1') # No-op once the V1 models are loaded
+    print("1. Extracting keypoints from the decoded frames")
     
-    # Adapted from extract_normalized_features_from_images in run_scripts.py
-    image_paths = sorted(glob.glob(os.path.join(video_frames_dir, '*.jpg'))) # or .png, etc.
-    if not image_paths:
-        raise FileNotFoundError(f"No frames found in {video_frames_dir}")
-
-    keypoints_sequence = []
-    model = MODELS['keypoint_extractor']
-    for img_path in image_paths:
+    def check_cancelled():
         if cancellation_check():
             raise TaskCancelledError("Cancellation detected before gloss prediction.")
-        batch_results = inference_topdown(model, img_path)
-        results = merge_data_samples(batch_results)
-        if hasattr(results, 'pred_instances') and results.pred_instances is not None:
-            keypoints = results.pred_instances.keypoints
-            keypoint_scores = (
-                results.pred_instances.keypoint_scores
-                if hasattr(results.pred_instances, 'keypoint_scores')
-                else np.ones(keypoints.shape[:2])
-            )
-            kp_with_scores = np.concatenate([keypoints, keypoint_scores[..., np.newaxis]], axis=-1)
-
-            valid_indices = [i for i in range(kp_with_scores.shape[1]) if i not in range(14, 24)]
-            kp_filtered = kp_with_scores[0][valid_indices]
-            keypoints_sequence.append(kp_filtered)
-
-    if not keypoints_sequence:
-        raise ValueError("No valid keypoints extracted from frames.")
-
-    stacked_keypoints = np.stack(keypoints_sequence, axis=0)
-    T, N, D = stacked_keypoints.shape
-    flattened_keypoints = stacked_keypoints.reshape(T, -1)
-    kp_tensor = torch.tensor(flattened_keypoints, dtype=torch.float32)
-    mean = kp_tensor.mean(dim=1, keepdim=True)
-    std = kp_tensor.std(dim=1, keepdim=True)
-    std = torch.where(std < 1e-6, torch.tensor(1.0, device=std.device), std)
-    normalized_tensor = (kp_tensor - mean) / std
-    features = normalized_tensor.cpu().numpy()
-    np.save(keypoints_output_file, features.reshape(T, -1))
-    print(f"   Keypoints saved to {keypoints_output_file}")
+
+    # Adapted from extract_normalized_features_from_images in run_scripts.py
+    # Frames are sent to the pose model in batches of Config.POSE_BATCH_SIZE.
+    # With person tracking, each task gets its own tracker so the pose crops follow the signer.
+    tracker = None
+    if 'person_detector' in MODELS:
+        tracker = PersonBoxTracker(
+            MODELS['person_detector'],
+            redetect_interval=Config.POSE_TRACK_REDETECT_INTERVAL,
+            min_confidence=Config.POSE_TRACK_MIN_CONFIDENCE,
+        )
+    keypoints_sequence = MODELS['pose_extractor'].extract(frames, before_batch=check_cancelled, tracker=tracker) # (T, 123, 3)
+
+    if len(keypoints_sequence) == 0:
+        raise ValueError("Pipeline V1: Could not extract any frames from the video. It might be corrupted or in an unsupported format.")
+    print(f"   Processed {len(keypoints_sequence)} frames" + (f" ({tracker.detection_count} person detections)" if tracker else ""))
+
+    features = normalize_keypoint_sequence(keypoints_sequence) # (T, 369), handed to the CTC model in memory
+    if Config.SAVE_DEBUG_FEATURES:
+        keypoints_output_file = os.path.join(task_temp_dir, 'keypoints.npy')
+        np.save(keypoints_output_file, features)
+        print(f"   Keypoints saved to {keypoints_output_file}")
     if cancellation_check():
         raise TaskCancelledError("Cancellation detected before gloss prediction.")
     print("2. Generating gloss predictions (CTC)")
-    _, input_dim = np.load(keypoints_output_file).shape
-
-    predicted_glosses = MODELS['ctc_predictor'].predict(features_path=keypoints_output_file)
+    predicted_glosses = MODELS['ctc_predictor'].predict_features(features, beam_width=Config.CTC_BEAM_WIDTH)
     print(f"   Predicted glosses: '{predicted_glosses}'")
     print("3. Translating glosses to text")
-    original_text = MODELS['gloss_translator'].translate(gloss_sequence=predicted_glosses)
+    original_text = translate_glosses(predicted_glosses)
     print(f"   Original text: '{original_text}'")
     print("4. Translating to target language")
     final_text = text_translation(original_text,targetLang)
@@ -164,6 +264,27 @@ def run_translation_pipeline(video_frames_dir: str, task_temp_dir: str, targetLa
         "target_lang": targetLang,
     }
 
+def translate_glosses(gloss_sequence):
+    """
+    Same output as GlossTranslator.translate, through the translation cache and the batched
+    generator shared by concurrent requests (errors are not cached).
+    """
+    if not isinstance(gloss_sequence, str) or not gloss_sequence.strip():
+        return ""
+    cache = MODELS['gloss_translation_cache']
+    cached = cache.get(gloss_sequence, GLOSS_TRANSLATION_PARAMS)
+    if cached is not None:
+        print("   (gloss translation served from cache)")
+        return cached
+    try:
+        text = MODELS['gloss_generator'](TASK_PREFIX + gloss_sequence, early_stopping=True, **GLOSS_TRANSLATION_PARAMS)
+    except Exception as e:
+        print(f"❌ Error during translation for gloss sequence: '{gloss_sequence[:50]}...'")
+        print(f"   Error: {e}")
+        return "TRANSLATION_ERROR"
+    cache.put(gloss_sequence, GLOSS_TRANSLATION_PARAMS, text)
+    return text
+
 def text_translation(text, target_lang):
     print(target_lang)
     if target_lang not in lang_codes:
@@ -172,11 +293,13 @@ def text_translation(text, target_lang):
         return text
     source_lang = "deu_Latn"  # Texte source en allemand
     target_lang_code = lang_codes[target_lang]
-    tokenizer.src_lang = source_lang
-    encoded = tokenizer(text, return_tensors="pt")
-    generated_tokens = model.generate(
-        **encoded,
-        forced_bos_token_id=tokenizer.convert_tokens_to_ids(target_lang_code)
-    )
-    translated = tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
-    return translated[0]
+    REGISTRY.ensure_loaded('text_translator') # NLLB is loaded on the first non-German request
+    cache_params = {"src_lang": source_lang, "tgt_lang": target_lang_code}
+    cached = MODELS['text_translation_cache'].get(text, cache_params)
+    if cached is not None:
+        return cached
+    tokenizer = MODELS['text_tokenizer']
+    tokenizer.src_lang = source_lang # Toujours l'allemand : les requêtes d'un même batch partagent la langue source
+    translated = MODELS['text_generator'](text, forced_bos_token_id=tokenizer.convert_tokens_to_ids(target_lang_code))
+    MODELS['text_translation_cache'].put(text, cache_params, translated)
+    return translated
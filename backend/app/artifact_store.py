@@ -0,0 +1,251 @@
+# backend/app/artifact_store.py
+import base64
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections.abc import Mapping
+
+import numpy as np
+import torch
+from huggingface_hub import hf_hub_download
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+
+MANIFEST_FILENAME = "manifest.json"
+METADATA_FILENAME = "metadata.json"
+# Bumped when the artifact layout or the metadata encoding changes: older artifacts are converted again
+ARTIFACT_FORMAT = 2
+# Training-only entries never copied into an artifact
+SKIPPED_CHECKPOINT_KEYS = {'optimizer', 'optimizer_state_dict', 'scheduler', 'scheduler_state_dict', 'lr_scheduler', 'scaler',
+                           'message_hub', 'param_schedulers'}
+
+
+class ArtifactStore:
+    """
+    Offline-first local copy of the Hugging Face checkpoints, as weights-only safetensors.
+    The first fetch() of a hub file downloads it, converts it once into an artifact folder
+    named after the sha256 of the checkpoint (one <group>.safetensors per state dict, e.g.
+    'state_dict' or 'cnn_encoder_state_dict', and a metadata.json sidecar for the other values:
+    epoch, vocab size, mmengine meta...) and records it in manifest.json. Later fetches return
+    the folder without touching the network, and load_artifact() reads the tensors straight
+    from the safetensors files instead of unpickling the whole checkpoint (optimizer state included).
+    fetch_file() keeps other hub files (e.g. a vocabulary) as-is, with the same offline reuse.
+    With check_updates, the hub is asked for the current file and a new checkpoint gets a new
+    artifact. If a conversion fails, fetch() falls back to the downloaded checkpoint path.
+    """
+    def __init__(self, root: str, repo_id: str, check_updates: bool = False):
+        self.root = root
+        self.repo_id = repo_id
+        self.check_updates = check_updates
+        self.manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+
+    def _read_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _record(self, filename: str, entry: dict):
+        with self._lock:
+            manifest = self._read_manifest()
+            manifest[filename] = entry
+            tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _local_artifact(self, key: str):
+        """Recorded artifact (folder or plain file) of `key` if it is complete and in the current format, else None."""
+        entry = self._read_manifest().get(key)
+        if not entry or entry.get('format') != ARTIFACT_FORMAT:
+            return None
+        artifact_path = os.path.join(self.root, entry['artifact'])
+        complete = os.path.isfile(artifact_path) or os.path.exists(os.path.join(artifact_path, METADATA_FILENAME))
+        if not complete:
+            return None
+        print(f"✅ Using local artifact {entry['artifact']} for {key} (no download)")
+        return artifact_path
+
+    def fetch(self, filename: str) -> str:
+        """Returns the local artifact folder of a hub checkpoint (or the checkpoint path if it could not be converted)."""
+        artifact_dir = None if self.check_updates else self._local_artifact(filename)
+        if artifact_dir:
+            return artifact_dir
+
+        print(f"Downloading {filename} from {self.repo_id}...")
+        checkpoint_path = hf_hub_download(repo_id=self.repo_id, filename=filename)
+        return self._convert(filename, checkpoint_path)
+
+    def fetch_file(self, filename: str) -> str:
+        """Local copy of a hub file that is not a checkpoint (kept as-is, not converted)."""
+        local_path = None if self.check_updates else self._local_artifact(filename)
+        if local_path:
+            return local_path
+
+        print(f"Downloading {filename} from {self.repo_id}...")
+        downloaded_path = hf_hub_download(repo_id=self.repo_id, filename=filename)
+        sha256 = file_sha256(downloaded_path)
+        artifact_name = os.path.join('files', f"{sha256[:16]}-{os.path.basename(filename)}")
+        local_path = os.path.join(self.root, artifact_name)
+        if not os.path.exists(local_path):
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            tmp_path = f"{local_path}.{os.getpid()}.tmp"
+            shutil.copyfile(downloaded_path, tmp_path)
+            os.replace(tmp_path, local_path)
+        self._record(filename, {'artifact': artifact_name, 'format': ARTIFACT_FORMAT, 'sha256': sha256, 'converted_at': time.time()})
+        return local_path
+
+    def fetch_url(self, url: str) -> str:
+        """
+        Same as fetch() for a checkpoint published at a plain URL (e.g. download.openmmlab.com).
+        Those file names carry their hash, so a recorded artifact is always reused.
+        """
+        artifact_dir = self._local_artifact(url)
+        if artifact_dir:
+            return artifact_dir
+
+        print(f"Downloading {url}...")
+        download_dir = os.path.join(self.root, 'downloads')
+        os.makedirs(download_dir, exist_ok=True)
+        checkpoint_path = os.path.join(download_dir, os.path.basename(url))
+        if not os.path.exists(checkpoint_path):
+            torch.hub.download_url_to_file(url, checkpoint_path)
+        artifact_dir = self._convert(url, checkpoint_path)
+        if artifact_dir != checkpoint_path:
+            os.remove(checkpoint_path) # The artifact replaces it
+        return artifact_dir
+
+    def _convert(self, key: str, checkpoint_path: str) -> str:
+        sha256 = file_sha256(checkpoint_path)
+        artifact_name = f"{sha256[:16]}-v{ARTIFACT_FORMAT}"
+        artifact_dir = os.path.join(self.root, artifact_name)
+        try:
+            if not os.path.exists(os.path.join(artifact_dir, METADATA_FILENAME)):
+                convert_checkpoint(checkpoint_path, artifact_dir)
+                print(f"✅ Converted {key} to safetensors in {artifact_dir}")
+        except Exception as e:
+            print(f"⚠️ Could not convert {key} to safetensors ({e}), loading the checkpoint directly.")
+            return checkpoint_path
+        self._record(key, {'artifact': artifact_name, 'format': ARTIFACT_FORMAT, 'sha256': sha256, 'converted_at': time.time()})
+        return artifact_dir
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def convert_checkpoint(checkpoint_path: str, artifact_dir: str):
+    """
+    Writes the state dicts of a torch checkpoint as <group>.safetensors files and its other
+    (non-training) entries as metadata.json. A bare state dict becomes the 'state_dict' group.
+    """
+    # Full unpickling, once: our own checkpoints, whose mmengine meta holds numpy arrays
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+    if _is_state_dict(checkpoint):
+        checkpoint = {'state_dict': checkpoint}
+
+    groups, metadata = {}, {}
+    for key, value in checkpoint.items():
+        if key in SKIPPED_CHECKPOINT_KEYS:
+            continue
+        if _is_state_dict(value):
+            groups[key] = value
+        else:
+            metadata[key] = value
+    if not groups:
+        raise ValueError("no state dict found in the checkpoint")
+
+    # Written in a temporary folder then renamed, so a concurrent worker never sees a partial artifact
+    tmp_dir = f"{artifact_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        for group, state_dict in groups.items():
+            # clone(): safetensors refuses tensors sharing storage (tied weights)
+            tensors = {name: tensor.detach().cpu().contiguous().clone() for name, tensor in state_dict.items()}
+            save_file(tensors, os.path.join(tmp_dir, f"{group}.safetensors"))
+        with open(os.path.join(tmp_dir, METADATA_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump({'groups': sorted(groups), 'metadata': _encode_json(metadata)}, f)
+        try:
+            os.rename(tmp_dir, artifact_dir)
+        except OSError:
+            if not os.path.exists(os.path.join(artifact_dir, METADATA_FILENAME)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_artifact(artifact_dir: str, device='cpu'):
+    """
+    Reads the safetensors of an artifact folder (no unpickling). The tensors are copies, not views
+    of the file: load them with load_state_dict(assign=True) to avoid a second copy.
+    Returns:
+        tuple: ({group: state_dict}, metadata dict)
+    """
+    with open(os.path.join(artifact_dir, METADATA_FILENAME), 'r', encoding='utf-8') as f:
+        sidecar = json.load(f, object_hook=_decode_json)
+    groups = {}
+    for group in sidecar['groups']:
+        with safe_open(os.path.join(artifact_dir, f"{group}.safetensors"), framework="pt", device=str(device)) as f:
+            groups[group] = {name: f.get_tensor(name) for name in f.keys()}
+    return groups, sidecar['metadata']
+
+
+def _is_state_dict(value) -> bool:
+    return isinstance(value, Mapping) and len(value) > 0 and all(isinstance(v, torch.Tensor) for v in value.values())
+
+
+def _encode_json(value):
+    """
+    JSON-safe copy of a metadata value. Types JSON would alter are tagged so _decode_json restores
+    them exactly: numpy arrays (e.g. mmengine dataset_meta sigmas), tuples, sets, bytes, and mappings
+    with non-string keys (e.g. keypoint_id2name {0: 'nose'}). Any other type raises TypeError.
+    """
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, Mapping):
+        if all(isinstance(key, str) for key in value):
+            return {key: _encode_json(item) for key, item in value.items()}
+        return {'__items__': [[_encode_json(key), _encode_json(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [_encode_json(item) for item in value]
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode_json(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': [_encode_json(item) for item in value]}
+    if isinstance(value, torch.Tensor):
+        value = value.detach().cpu().numpy()
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(), 'dtype': str(value.dtype)}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"cannot store a {type(value).__name__} in the artifact metadata")
+
+
+def _decode_json(obj):
+    if '__ndarray__' in obj:
+        return np.array(obj['__ndarray__'], dtype=obj['dtype'])
+    if '__items__' in obj:
+        return {_hashable(key): item for key, item in obj['__items__']}
+    if '__tuple__' in obj:
+        return tuple(obj['__tuple__'])
+    if '__set__' in obj:
+        return set(obj['__set__'])
+    if '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+def _hashable(key):
+    # Decoded keys are ints, strings or tuples (already restored by the object hook)
+    return tuple(key) if isinstance(key, list) else key
@@ -0,0 +1,143 @@
+# backend/app/batching.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _PendingItem:
+    __slots__ = ('payload', 'future', 'enqueued_at')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class DynamicBatcher:
+    """
+    In-process micro-batching for model inference.
+    Request threads submit single items; a background worker collects them for up to
+    `max_wait_ms` or until `max_batch_size` items are pending, calls
+    `process_batch(list_of_payloads)` once, and resolves each caller's future with its
+    own result (process_batch must return one result per payload, in order).
+    A lone request therefore waits at most `max_wait_ms` more than before, while
+    concurrent requests share one forward pass.
+
+    The worker thread is started lazily on the first submit and restarted if the process
+    id changed, so a batcher created before a fork (gunicorn preload) works in each worker.
+    """
+    def __init__(self, process_batch: callable, max_batch_size: int = 8, max_wait_ms: float = 10.0, name: str = 'batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.name = name
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._largest_batch = 0
+        self._total_queue_wait = 0.0
+        self._total_batch_time = 0.0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive() and self._pid == os.getpid():
+                return self._queue
+            if self._pid != os.getpid():
+                # Forked child: the parent's queue and thread are not usable here
+                self._queue = queue.Queue()
+                self._reset_metrics()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, args=(self._queue,), name=f"{self.name}-worker", daemon=True)
+            self._worker.start()
+            return self._queue
+
+    def submit(self, payload) -> Future:
+        """Queues one item and returns a Future resolved with its result."""
+        item = _PendingItem(payload)
+        self._ensure_worker().put(item)
+        return item.future
+
+    def __call__(self, payload, timeout: float = None):
+        """Submits one item and blocks until its result is ready (exceptions are re-raised here)."""
+        return self.submit(payload).result(timeout)
+
+    def _collect(self, work_queue):
+        batch = [work_queue.get()]
+        if batch[0] is None:
+            return None
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = work_queue.get(timeout=remaining) if remaining > 0 else work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                work_queue.put(None) # Stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self, work_queue):
+        while True:
+            batch = self._collect(work_queue)
+            if batch is None:
+                return
+            batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                results = self.process_batch([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: process_batch returned {len(results)} results for {len(batch)} items.")
+            except Exception as e:
+                print(f"❌ {self.name}: batch of {len(batch)} failed: {e}")
+                self._errors += 1
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+            finally:
+                finished = time.monotonic()
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+                self._total_queue_wait += sum(started - item.enqueued_at for item in batch)
+                self._total_batch_time += finished - started
+
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
+
+    def stats(self) -> dict:
+        batches = self._batches
+        items = self._items
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': 1000.0 * self.max_wait,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'batches': batches,
+            'items': items,
+            'errors': self._errors,
+            'avg_batch_size': items / batches if batches else 0.0,
+            'largest_batch': self._largest_batch,
+            'avg_queue_wait_ms': 1000.0 * self._total_queue_wait / items if items else 0.0,
+            'avg_batch_ms': 1000.0 * self._total_batch_time / batches if batches else 0.0,
+        }
+
+    def close(self):
+        """Stops the worker once the items already queued are processed."""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive() and self._pid == os.getpid():
+                self._queue.put(None)
+                self._worker.join()
+            self._worker = None
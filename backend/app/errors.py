@@ -0,0 +1,6 @@
+# backend/app/errors.py
+# Exceptions shared by the task, frame reading and pipeline modules (no heavy imports here).
+
+
+class TaskCancelledError(Exception):
+    pass
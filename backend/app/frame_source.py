@@ -0,0 +1,208 @@
+# backend/app/frame_source.py
+import os
+import cv2
+import numpy as np
+from .errors import TaskCancelledError
+
+
+def iter_video_frames(video_path: str, cancellation_check: callable = None, debug_frames_dir: str = None):
+    """
+    Decodes a video and yields its frames one by one as BGR uint8 ndarrays.
+    Frames go straight from the container to the caller: nothing is written to disk
+    unless `debug_frames_dir` is given, in which case each frame is also dumped as a JPEG
+    (same naming as the old frames_v1/ layout) for offline inspection.
+    Args:
+        video_path: Path to the uploaded video file.
+        cancellation_check: Optional callable returning True when the task must stop.
+        debug_frames_dir: Optional folder where decoded frames are also saved.
+    Yields:
+        np.ndarray: The decoded frame (H, W, 3), BGR.
+    """
+    if debug_frames_dir:
+        os.makedirs(debug_frames_dir, exist_ok=True)
+
+    vidcap = cv2.VideoCapture(video_path)
+    if not vidcap.isOpened():
+        raise ValueError(f"Could not open video file {video_path}.")
+    try:
+        count = 0
+        success, image = vidcap.read()
+        while success:
+            if cancellation_check is not None and cancellation_check():
+                raise TaskCancelledError("Cancelled during frame extraction.")
+            if debug_frames_dir:
+                cv2.imwrite(os.path.join(debug_frames_dir, f"frame{count:05d}.jpg"), image)
+            yield image
+            count += 1
+            success, image = vidcap.read()
+    finally:
+        vidcap.release()
+
+
+def sample_frame_indices(num_frames: int, num_samples: int) -> np.ndarray:
+    """Evenly spaced frame indices used to bring a video to a fixed number of input frames."""
+    return np.linspace(0, num_frames - 1, num=num_samples, dtype=int)
+
+
+# Above this size the decoded frames are spilled to a raw uint8 memmap in the task folder.
+DEFAULT_MAX_IN_MEMORY_BYTES = 512 * 1024 * 1024
+
+
+class FrameStore:
+    """
+    Decode-once frame buffer for a single video, shared by every consumer of a task
+    (MediaPipe keypoints, RGB tensors, ...). Frames are stored as a contiguous uint8
+    array of shape (T, H, W, 3), BGR, either in memory or in a raw np.memmap when the
+    video is too large. Nothing is ever re-encoded or re-read from an image file.
+    """
+    def __init__(self, frames: np.ndarray, memmap_path: str = None, source_indices: np.ndarray = None,
+                 num_source_frames: int = None):
+        self.frames = frames
+        self.memmap_path = memmap_path
+        # Position of each stored frame in the original video (all frames unless the store was sampled).
+        self.source_indices = source_indices
+        self.num_source_frames = num_source_frames
+
+    @classmethod
+    def from_video(cls, video_path: str, cancellation_check: callable = None, debug_frames_dir: str = None,
+                   spill_dir: str = None, max_in_memory_bytes: int = DEFAULT_MAX_IN_MEMORY_BYTES,
+                   num_samples: int = None):
+        """
+        Decodes the video exactly once into a FrameStore.
+        Args:
+            video_path: Path to the uploaded video file.
+            cancellation_check: Optional callable returning True when the task must stop.
+            debug_frames_dir: Optional folder where decoded frames are also saved as JPEGs.
+            spill_dir: Folder for the memmap file if the frames exceed max_in_memory_bytes.
+                       Without it, frames always stay in memory.
+            max_in_memory_bytes: Size threshold above which frames are spilled to spill_dir.
+            num_samples: If set, only the frames picked by sample_frame_indices(frame_count, num_samples)
+                         are decoded and stored (see from_video_sampled).
+        """
+        if num_samples:
+            return cls.from_video_sampled(video_path, num_samples, cancellation_check, debug_frames_dir)
+
+        vidcap = cv2.VideoCapture(video_path)
+        # The container frame count is only a hint (it can be 0 or slightly off), the buffer grows if needed.
+        expected_count = max(int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+        vidcap.release()
+
+        store = None
+        count = 0
+        for frame in iter_video_frames(video_path, cancellation_check, debug_frames_dir):
+            if store is None:
+                store = cls._allocate(max(expected_count, 1), frame.shape, spill_dir, max_in_memory_bytes)
+            elif count >= len(store.frames):
+                store = store._grow(count + max(count // 2, 1), spill_dir, max_in_memory_bytes)
+            store.frames[count] = frame
+            count += 1
+
+        if store is None:
+            return cls(np.empty((0, 0, 0, 3), dtype=np.uint8), num_source_frames=0)
+        store.frames = store.frames[:count]
+        store.num_source_frames = count
+        return store
+
+    @classmethod
+    def from_video_sampled(cls, video_path: str, num_samples: int, cancellation_check: callable = None,
+                           debug_frames_dir: str = None, frame_count: int = None):
+        """
+        Decodes only the frames a fixed-length model input will use.
+        The frame count is read from the container up front, the sample indices are computed
+        with sample_frame_indices, and the video is walked once with grab(). grab() still decodes
+        every frame (inter-frame codecs need them as references): it only skips the colour
+        conversion and copy done by retrieve(), which are paid for the selected frames only.
+        Sequential grabbing is used instead of CAP_PROP_POS_FRAMES seeks, which are not
+        frame-accurate for every codec.
+        If the container frame count turns out to be wrong, the walk is redone with the real count,
+        and if it is missing altogether the whole video is decoded instead.
+        """
+        if debug_frames_dir:
+            os.makedirs(debug_frames_dir, exist_ok=True)
+
+        vidcap = cv2.VideoCapture(video_path)
+        if not vidcap.isOpened():
+            raise ValueError(f"Could not open video file {video_path}.")
+        try:
+            if frame_count is None:
+                frame_count = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if frame_count <= 0:
+                print(f"Frame count unavailable for {video_path}, decoding every frame.")
+                return cls.from_video(video_path, cancellation_check, debug_frames_dir)
+
+            wanted = np.unique(sample_frame_indices(frame_count, num_samples))
+            frames = []
+            position = 0 # Index of the next frame in the container
+            for target in wanted:
+                while position < target and vidcap.grab():
+                    position += 1
+                if cancellation_check is not None and cancellation_check():
+                    raise TaskCancelledError("Cancelled during frame extraction.")
+                success, image = vidcap.read() if position == target else (False, None)
+                if not success:
+                    break
+                if debug_frames_dir:
+                    cv2.imwrite(os.path.join(debug_frames_dir, f"frame{position:05d}.jpg"), image)
+                frames.append(image)
+                position += 1
+
+            if len(frames) < len(wanted):
+                # The container announced more frames than it holds: `position` is the real count.
+                print(f"Container reported {frame_count} frames but only {position} could be decoded, resampling.")
+                if position == 0:
+                    return cls(np.empty((0, 0, 0, 3), dtype=np.uint8), num_source_frames=0)
+                return cls.from_video_sampled(video_path, num_samples, cancellation_check, debug_frames_dir, position)
+
+            if vidcap.grab():
+                # The container announced fewer frames than it holds: count the rest and resample.
+                position += 1
+                while vidcap.grab():
+                    position += 1
+                print(f"Container reported {frame_count} frames but holds {position}, resampling.")
+                return cls.from_video_sampled(video_path, num_samples, cancellation_check, debug_frames_dir, position)
+        finally:
+            vidcap.release()
+
+        return cls(np.stack(frames, axis=0), source_indices=wanted, num_source_frames=frame_count)
+
+    @classmethod
+    def _allocate(cls, capacity: int, frame_shape: tuple, spill_dir: str, max_in_memory_bytes: int):
+        shape = (capacity,) + tuple(frame_shape)
+        nbytes = int(np.prod(shape))
+        if spill_dir and nbytes > max_in_memory_bytes:
+            memmap_path = os.path.join(spill_dir, f"frames_{capacity}.u8")
+            return cls(np.memmap(memmap_path, dtype=np.uint8, mode='w+', shape=shape), memmap_path)
+        return cls(np.empty(shape, dtype=np.uint8))
+
+    def _grow(self, capacity: int, spill_dir: str, max_in_memory_bytes: int):
+        grown = FrameStore._allocate(capacity, self.frames.shape[1:], spill_dir, max_in_memory_bytes)
+        grown.frames[:len(self.frames)] = self.frames
+        self.close()
+        return grown
+
+    def positions_of(self, source_indices) -> np.ndarray:
+        """Maps frame indices of the original video to positions in this store."""
+        source_indices = np.asarray(source_indices)
+        if self.source_indices is None:
+            return source_indices
+        positions = np.searchsorted(self.source_indices, source_indices)
+        if np.any(positions >= len(self.source_indices)) or np.any(self.source_indices[np.minimum(positions, len(self.source_indices) - 1)] != source_indices):
+            raise IndexError("Some requested frames were not decoded in this sampled FrameStore.")
+        return positions
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def close(self):
+        """Releases the buffer and removes the memmap file, if any."""
+        memmap_path = self.memmap_path
+        self.frames = None
+        self.memmap_path = None
+        if memmap_path and os.path.exists(memmap_path):
+            os.remove(memmap_path)
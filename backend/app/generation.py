@@ -0,0 +1,109 @@
+# backend/app/generation.py
+import bisect
+import threading
+from collections import deque
+
+import numpy as np
+import torch
+
+from .batching import DynamicBatcher
+
+
+class BatchedGenerator:
+    """
+    generate() of a seq2seq model (GlossTranslator's Flan-T5, the V2 T5, NLLB) shared by
+    concurrent requests. Calls are micro-batched by a DynamicBatcher: the texts of a batch
+    are tokenized together, padded to the longest one (not to a fixed max_length), run
+    through a single generate() and decoded back to each caller.
+    Only calls with the same generate kwargs (beams, max_length, forced BOS token...) share
+    a generate(); a batch mixing several is split into one generate() per kwargs group.
+    With max_batch_size <= 1 each call runs its own generate() in the caller's thread.
+    """
+    def __init__(self, model, tokenizer, device, max_batch_size: int = 1, max_wait_ms: float = 10.0,
+                 max_input_length: int = None, name: str = 'generator'):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_input_length = max_input_length
+        self.name = name
+        self.batcher = None
+        if max_batch_size > 1:
+            self.batcher = DynamicBatcher(self._process_batch, max_batch_size=max_batch_size,
+                                          max_wait_ms=max_wait_ms, name=f"{name}-batcher")
+
+    def __call__(self, text: str, **generate_kwargs) -> str:
+        """Generates the output text of one input text."""
+        payload = (text, tuple(sorted(generate_kwargs.items())))
+        if self.batcher is not None:
+            return self.batcher(payload)
+        return self._process_batch([payload])[0]
+
+    @torch.no_grad()
+    def generate_batch(self, texts, **generate_kwargs):
+        """Tokenizes `texts` with dynamic padding, runs one generate() and returns the decoded outputs."""
+        tokenized = self.tokenizer(
+            list(texts),
+            padding=True, # Pad to the longest text of the batch
+            truncation=self.max_input_length is not None,
+            max_length=self.max_input_length,
+            return_tensors="pt"
+        ).to(self.device)
+        generated_ids = self.model.generate(
+            input_ids=tokenized['input_ids'],
+            attention_mask=tokenized['attention_mask'],
+            **generate_kwargs
+        )
+        return self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+
+    def _process_batch(self, payloads):
+        results = [None] * len(payloads)
+        groups = {}
+        for i, (_, kwargs_key) in enumerate(payloads):
+            groups.setdefault(kwargs_key, []).append(i)
+        for kwargs_key, indices in groups.items():
+            outputs = self.generate_batch([payloads[i][0] for i in indices], **dict(kwargs_key))
+            for i, output in zip(indices, outputs):
+                results[i] = output
+        return results
+
+    def stats(self) -> dict:
+        return self.batcher.stats() if self.batcher is not None else {'max_batch_size': 1}
+
+
+class LatencyByLength:
+    """
+    Latency distribution of a model call per input-length bucket (e.g. tokens of the T5 gloss
+    prompt). Bucket i holds the inputs of length < edges[i] (the last one everything above);
+    the latest `window` latencies of each bucket are kept for the percentiles.
+    """
+    def __init__(self, edges=(8, 16, 32, 64), window: int = 1000):
+        self.edges = sorted(edges)
+        self._lock = threading.Lock()
+        self._latencies = [deque(maxlen=window) for _ in range(len(self.edges) + 1)]
+        self._counts = [0] * (len(self.edges) + 1)
+
+    def _label(self, i):
+        low = self.edges[i - 1] if i > 0 else 0
+        return f"{low}-{self.edges[i] - 1}" if i < len(self.edges) else f"{low}+"
+
+    def record(self, length: int, seconds: float):
+        i = bisect.bisect_right(self.edges, length)
+        with self._lock:
+            self._latencies[i].append(seconds)
+            self._counts[i] += 1
+
+    def stats(self) -> dict:
+        buckets = {}
+        with self._lock:
+            for i, latencies in enumerate(self._latencies):
+                if not latencies:
+                    continue
+                ms = 1000.0 * np.asarray(latencies)
+                buckets[self._label(i)] = {
+                    'count': self._counts[i],
+                    'mean_ms': float(ms.mean()),
+                    'p50_ms': float(np.percentile(ms, 50)),
+                    'p95_ms': float(np.percentile(ms, 95)),
+                    'max_ms': float(ms.max()),
+                }
+        return buckets
@@ -0,0 +1,131 @@
+# backend/app/model_registry.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _ModelEntry:
+    def __init__(self, name, loader, pipelines, depends_on, warmup):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.pipelines = tuple(pipelines)
+        self.depends_on = tuple(depends_on)
+        self.lock = threading.Lock()
+        self.state = 'not_loaded' # not_loaded -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+
+class ModelRegistry:
+    """
+    Lazy, on-demand loading of the AI models.
+    Each model is registered with a loader (which fills MODELS / MODELS_V2), the pipelines that
+    use it ('v1', 'v2') and the models it needs first. A model is loaded once, on the first
+    ensure_loaded() / load_pipeline() that needs it; concurrent callers wait for the same load.
+    A failed load is reported by status() and retried on the next call.
+    preload() loads the models of the enabled pipelines concurrently at startup, then runs the
+    optional `warmup` of each one (a synthetic inference: first-call allocations, oneDNN kernel
+    selection...) so the first real request does not pay for it.
+    """
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, name: str, loader: callable, pipelines=(), depends_on=(), warmup: callable = None):
+        self._entries[name] = _ModelEntry(name, loader, pipelines, depends_on, warmup)
+
+    def models_of(self, pipeline: str) -> list:
+        return [name for name, entry in self._entries.items() if pipeline in entry.pipelines]
+
+    def _resolve(self, names) -> list:
+        # Pipelines ('v1', 'v2') are expanded to their models; a model name stands for itself
+        return [model for name in names for model in ([name] if name in self._entries else self.models_of(name))]
+
+    def ensure_loaded(self, name: str):
+        """Loads the model (and the models it depends on) if needed; raises the loader's error."""
+        entry = self._entries[name]
+        if entry.state == 'ready':
+            return
+        for dependency in entry.depends_on:
+            self.ensure_loaded(dependency)
+        with entry.lock:
+            if entry.state == 'ready':
+                return
+            entry.state = 'loading'
+            start = time.perf_counter()
+            try:
+                entry.loader()
+            except Exception as e:
+                entry.state = 'failed'
+                entry.error = str(e)
+                print(f"❌ Model '{name}' failed to load: {e}")
+                raise
+            entry.load_seconds = time.perf_counter() - start
+            entry.error = None
+            entry.state = 'ready'
+            print(f"✅ Model '{name}' ready ({entry.load_seconds:.1f}s)")
+
+    def load_pipeline(self, pipeline: str):
+        """Loads every model of a pipeline ('v1' or 'v2')."""
+        for name in self.models_of(pipeline):
+            self.ensure_loaded(name)
+
+    def _warm_up(self, name: str):
+        entry = self._entries[name]
+        if entry.warmup is None or entry.state != 'ready':
+            return
+        start = time.perf_counter()
+        try:
+            entry.warmup()
+        except Exception as e:
+            print(f"⚠️ Warm-up of '{name}' failed (the model stays usable): {e}")
+            return
+        entry.warmup_seconds = time.perf_counter() - start
+
+    def preload(self, pipelines, max_workers: int = 4, warmup: bool = True):
+        """
+        Loads every model of `pipelines` (pipeline or model names, e.g. ['v1', 'text_translator'])
+        in a thread pool (a model waits for its dependencies),
+        then warms them up, and prints the load / warm-up time of each model.
+        Load errors are reported but do not stop the other models (they are retried on first use).
+        """
+        names = list(dict.fromkeys(self._resolve(pipelines)))
+        if not names:
+            return
+        print(f"Preloading {len(names)} models for pipelines {', '.join(pipelines)} ({max_workers} threads)...")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix='model-preload') as executor:
+            for name, future in [(name, executor.submit(self.ensure_loaded, name)) for name in names]:
+                try:
+                    future.result()
+                except Exception:
+                    pass # Already reported by ensure_loaded, status() keeps the error
+            if warmup:
+                list(executor.map(self._warm_up, names))
+        print(f"Preload finished in {time.perf_counter() - start:.1f}s:")
+        for name in names:
+            entry = self._entries[name]
+            load = f"{entry.load_seconds:.1f}s" if entry.load_seconds is not None else "-"
+            warm = f"{entry.warmup_seconds:.2f}s" if entry.warmup_seconds is not None else "-"
+            print(f"   {name:<20} {entry.state:<10} load {load:>7}  warm-up {warm:>7}")
+
+    def is_ready(self, pipeline: str) -> bool:
+        names = self.models_of(pipeline)
+        return bool(names) and all(self._entries[name].state == 'ready' for name in names)
+
+    def status(self) -> dict:
+        return {
+            name: {
+                'state': entry.state,
+                'pipelines': list(entry.pipelines),
+                'load_seconds': entry.load_seconds,
+                'warmup_seconds': entry.warmup_seconds,
+                'error': entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+# Shared by ai_pipeline (V1 + NLLB) and pipeline_v2_orchestrator (V2)
+REGISTRY = ModelRegistry()
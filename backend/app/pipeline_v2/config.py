@@ -28,6 +28,12 @@ KEYPOINT_PATH = "/mnt/c/Users/pgravejal/data/phoenix-2014-T-keypoints/"
 # --- Preprocessing (Usually no path changes here) ---
 VIDEO_TYPE = "features"  # "features" means frames are already extracted as images
 NUM_FRAMES = 64          # Number of frames to sample per video for model input
+SAMPLED_FRAME_DECODING = True # Only decode (and run MediaPipe on) the NUM_FRAMES frames the model uses
+# MediaPipe Holistic: tracking (video) mode, one graph per task taken from a pool of HOLISTIC_POOL_SIZE graphs
+HOLISTIC_STATIC_IMAGE_MODE = False
+HOLISTIC_MODEL_COMPLEXITY = 1
+HOLISTIC_POOL_SIZE = int(os.environ.get("HOLISTIC_POOL_SIZE", 2)) # Size it to the cores left for MediaPipe (see /api/metrics)
+HOLISTIC_POOL_TIMEOUT = float(os.environ.get("HOLISTIC_POOL_TIMEOUT", 60.0)) # Seconds a task waits for a free graph
 IMG_SIZE = (224, 224)
 RGB_MEAN = [0.485, 0.456, 0.406]
 RGB_STD = [0.229, 0.224, 0.225]
@@ -93,6 +99,13 @@ BEST_MODEL_NAME_SLR = "twostream_best_epoch_067_wer31.12.pth" # UPDATED based on
 # Full path to the best SLR model checkpoint
 BEST_SLR_MODEL_PATH = os.path.join(CHECKPOINT_DIR_SLR, BEST_MODEL_NAME_SLR) # ADDED for clarity
 
+# --- CTC Decoding (SLR Model) ---
+CTC_BEAM_WIDTH = int(os.environ.get("V2_CTC_BEAM_WIDTH", 1)) # 1 = greedy (unless a gloss LM is set)
+# Gloss n-gram LM for shallow fusion, built with POC2/SLR/gloss_lm.py from the PHOENIX 'orth' annotations
+CTC_LM_PATH = os.environ.get("V2_CTC_LM_PATH")
+CTC_LM_WEIGHT = float(os.environ.get("V2_CTC_LM_WEIGHT", 0.5))
+CTC_LM_INSERTION_BONUS = float(os.environ.get("V2_CTC_LM_INSERTION_BONUS", 1.0))
+
 # --- Debugging ---
 DEBUG_MODE = False
 DEBUG_BATCHES_PER_EPOCH = 5
@@ -129,6 +142,16 @@ BEST_MODEL_NAME_TRANSLATOR = "translator_checkpoint_epoch_019.pth" # UPDATED bas
 # Full path to the best Translator model checkpoint
 BEST_TRANSLATOR_MODEL_PATH = os.path.join(CHECKPOINT_DIR_TRANSLATOR, BEST_MODEL_NAME_TRANSLATOR) # ADDED
 
+# --- Inference (Translation Model) ---
+# Concurrent tasks are grouped for up to T5_BATCH_MAX_WAIT_MS or T5_BATCH_MAX_SIZE prompts into one generate() (1 disables it)
+T5_BATCH_MAX_SIZE = int(os.environ.get("V2_T5_BATCH_MAX_SIZE", 8))
+T5_BATCH_MAX_WAIT_MS = float(os.environ.get("V2_T5_BATCH_MAX_WAIT_MS", 15))
+# Decoding budget of T5: max_new_tokens = T5_LENGTH_RATIO * gloss tokens + T5_LENGTH_MARGIN, rounded up to a
+# multiple of 8 (so similar-length prompts still share a batch), between T5_MIN_NEW_TOKENS and MAX_TEXT_SEQ_LEN + 10
+T5_LENGTH_RATIO = float(os.environ.get("V2_T5_LENGTH_RATIO", 2.0))
+T5_LENGTH_MARGIN = int(os.environ.get("V2_T5_LENGTH_MARGIN", 10))
+T5_MIN_NEW_TOKENS = int(os.environ.get("V2_T5_MIN_NEW_TOKENS", 16))
+
 # --- Evaluation (Translation Model) ---
 # Metrics: BLEU, METEOR, ROUGE
 
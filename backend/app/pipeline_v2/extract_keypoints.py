@@ -3,6 +3,10 @@ import mediapipe as mp
 import cv2
 import numpy as np
 import os
+import argparse
+import hashlib
+import json
+import multiprocessing
 import pandas as pd
 from tqdm import tqdm
 from . import config
@@ -53,54 +57,59 @@ print("-" * 30)
 LEFT_SHOULDER_INDEX = 11
 RIGHT_SHOULDER_INDEX = 12
 
+# Position of each block in the (TOTAL_LANDMARKS, NUM_COORDS) array, and the face gather indices
+POSE_SLICE = slice(0, NUM_POSE_LANDMARKS)
+LEFT_HAND_SLICE = slice(POSE_SLICE.stop, POSE_SLICE.stop + NUM_HAND_LANDMARKS)
+RIGHT_HAND_SLICE = slice(LEFT_HAND_SLICE.stop, LEFT_HAND_SLICE.stop + NUM_HAND_LANDMARKS)
+FACE_SLICE = slice(RIGHT_HAND_SLICE.stop, RIGHT_HAND_SLICE.stop + NUM_SELECTED_FACE_LANDMARKS)
+SELECTED_FACE_LANDMARK_INDEX_ARRAY = np.array(SELECTED_FACE_LANDMARK_INDICES, dtype=np.intp)
+
 # --- Helper Functions ---
 
+def _landmarks_to_array(landmarks, num_coords: int = NUM_COORDS):
+    """Converts a sequence of MediaPipe landmarks to an (N, num_coords) float32 array: (x, y, z), or (x, y) with num_coords=2."""
+    if num_coords == 2:
+        values = (value for lm in landmarks for value in (lm.x, lm.y))
+    else:
+        values = (value for lm in landmarks for value in (lm.x, lm.y, lm.z))
+    coords = np.fromiter(values, dtype=np.float32, count=num_coords * len(landmarks))
+    return coords.reshape(-1, num_coords)
+
+
+def extract_landmarks_into(results, frame_landmarks):
+    """
+    Writes pose, hands, and SELECTED face landmarks of one frame into `frame_landmarks`,
+    a preallocated (TOTAL_LANDMARKS, NUM_COORDS) row (e.g. one frame of a (T, 127, 3) buffer).
+    Missing parts are left as zeros. Face z is stored as 0.
+    """
+    frame_landmarks[:] = 0.0
+    for landmark_list, block in ((results.pose_landmarks, POSE_SLICE),
+                                 (results.left_hand_landmarks, LEFT_HAND_SLICE),
+                                 (results.right_hand_landmarks, RIGHT_HAND_SLICE)):
+        if landmark_list:
+            coords = _landmarks_to_array(landmark_list.landmark[:block.stop - block.start])
+            frame_landmarks[block.start:block.start + len(coords)] = coords
+
+    if results.face_landmarks:
+        # Only the 52 selected landmarks (out of 468) are read from the protobuf, x and y only
+        face = results.face_landmarks.landmark
+        valid = SELECTED_FACE_LANDMARK_INDEX_ARRAY < len(face)
+        if valid.all():
+            selected = [face[i] for i in SELECTED_FACE_LANDMARK_INDICES]
+        else:
+            print(f"Warning: {np.count_nonzero(~valid)} selected face indices out of bounds for detected landmarks.")
+            selected = [face[i] for i in SELECTED_FACE_LANDMARK_INDEX_ARRAY[valid].tolist()]
+        frame_landmarks[FACE_SLICE][valid, :2] = _landmarks_to_array(selected, num_coords=2)
+    return frame_landmarks
+
+
 def extract_landmarks_from_results(results):
     """
     Extracts pose, hands, and SELECTED face landmarks into a single array.
     Output shape: (TOTAL_LANDMARKS, NUM_COORDS) where TOTAL_LANDMARKS is the new count.
     """
-    # Create array based on the NEW total number of landmarks
     frame_landmarks = np.zeros((TOTAL_LANDMARKS, NUM_COORDS), dtype=np.float32)
-    current_idx = 0 # Use an index to track position in the output array
-
-    # Pose landmarks (NUM_POSE_LANDMARKS)
-    if results.pose_landmarks:
-        for i, lm in enumerate(results.pose_landmarks.landmark):
-            if i < NUM_POSE_LANDMARKS: # Ensure we don't go out of bounds
-                frame_landmarks[current_idx + i] = [lm.x, lm.y, lm.z]
-    # Else: remains zeros
-    current_idx += NUM_POSE_LANDMARKS
-
-    # Left Hand landmarks (NUM_HAND_LANDMARKS)
-    if results.left_hand_landmarks:
-        for i, lm in enumerate(results.left_hand_landmarks.landmark):
-             if i < NUM_HAND_LANDMARKS:
-                frame_landmarks[current_idx + i] = [lm.x, lm.y, lm.z]
-    # Else: remains zeros
-    current_idx += NUM_HAND_LANDMARKS
-
-    # Right Hand landmarks (NUM_HAND_LANDMARKS)
-    if results.right_hand_landmarks:
-        for i, lm in enumerate(results.right_hand_landmarks.landmark):
-            if i < NUM_HAND_LANDMARKS:
-                frame_landmarks[current_idx + i] = [lm.x, lm.y, lm.z]
-    # Else: remains zeros
-    current_idx += NUM_HAND_LANDMARKS
-
-    # Face landmarks (Selected Subset) ---
-    if results.face_landmarks:
-        # Iterate through our pre-defined SELECTED indices
-        for i, face_lm_idx in enumerate(SELECTED_FACE_LANDMARK_INDICES):
-            if face_lm_idx < len(results.face_landmarks.landmark):
-                lm = results.face_landmarks.landmark[face_lm_idx]
-                # Store its x, y, and 0.0 for z in our final array at the correct position
-                if current_idx + i < TOTAL_LANDMARKS:
-                     frame_landmarks[current_idx + i] = [lm.x, lm.y, 0.0] # Store z as 0
-            else:
-                 print(f"Warning: Selected face index {face_lm_idx} out of bounds for detected landmarks.")
-
-    return frame_landmarks
+    return extract_landmarks_into(results, frame_landmarks)
 
 
 def normalize_frame_keypoints(landmarks):
@@ -144,10 +153,169 @@ def normalize_frame_keypoints(landmarks):
 
     return normalized_landmarks
 
+def normalize_keypoints_sequence(keypoints, out=None):
+    """
+    Vectorized normalize_frame_keypoints over a whole (T, TOTAL_LANDMARKS, NUM_COORDS) sequence:
+    each frame is centered on the shoulder midpoint and scaled by the shoulder distance.
+    Frames with a missing shoulder or a negligible shoulder distance are masked to zeros.
+    `out` may be `keypoints` itself to normalize in place.
+    """
+    epsilon = 1e-6
+    left_shoulder = keypoints[:, LEFT_SHOULDER_INDEX]   # (T, 3)
+    right_shoulder = keypoints[:, RIGHT_SHOULDER_INDEX] # (T, 3)
+    reference_point = (left_shoulder + right_shoulder) / 2.0
+    reference_distance = np.linalg.norm(left_shoulder - right_shoulder, axis=1) # (T,)
+
+    valid = (
+        (np.abs(left_shoulder).sum(axis=1) >= epsilon)
+        & (np.abs(right_shoulder).sum(axis=1) >= epsilon)
+        & (reference_distance >= epsilon)
+    )
+    safe_distance = np.where(valid, reference_distance, 1.0)
+
+    out = np.empty_like(keypoints) if out is None else out
+    np.subtract(keypoints, reference_point[:, None, :], out=out)
+    out /= safe_distance[:, None, None]
+    out[~valid] = 0.0
+    return out
+
+
+def extract_video_keypoints(holistic, frames, num_frames=None):
+    """
+    Runs MediaPipe Holistic on a sequence of BGR frames and returns the normalized keypoints.
+    Landmarks are gathered into a preallocated (T, TOTAL_LANDMARKS, NUM_COORDS) buffer and the
+    whole sequence is normalized at once. Shared by the V2 pipeline and process_dataset.
+    Args:
+        holistic: A MediaPipe Holistic instance.
+        frames: Iterable of BGR frames; a None entry (unreadable frame) gives a zero row.
+        num_frames: Number of frames if known, to allocate the buffer once.
+    Returns:
+        (np.ndarray, int): Normalized keypoints (T, 127, 3) and the number of frames actually processed.
+    """
+    buffer = np.zeros((num_frames or 0, TOTAL_LANDMARKS, NUM_COORDS), dtype=np.float32)
+    count = 0
+    processed = 0
+    for frame in frames:
+        if count >= len(buffer):
+            buffer = np.concatenate([buffer, np.zeros((max(len(buffer), 16), TOTAL_LANDMARKS, NUM_COORDS), dtype=np.float32)])
+        if frame is not None:
+            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            img_rgb.flags.writeable = False # Performance boost
+            results = holistic.process(img_rgb)
+            extract_landmarks_into(results, buffer[count])
+            processed += 1
+        count += 1
+
+    keypoints = buffer[:count]
+    return normalize_keypoints_sequence(keypoints, out=keypoints), processed
+
 # --- Main Extraction Logic ---
+MANIFEST_FILENAME = "_manifest.jsonl"
+# Changes whenever the extracted layout changes (e.g. a new face landmark subset), so stale outputs are redone
+EXTRACTION_FINGERPRINT = hashlib.sha1(
+    json.dumps([NUM_POSE_LANDMARKS, NUM_HAND_LANDMARKS, SELECTED_FACE_LANDMARK_INDICES, NUM_COORDS]).encode()
+).hexdigest()[:12]
+
+_worker_holistic = None # One Holistic per worker process (see _init_worker)
+
+
+def _create_dataset_holistic():
+    return mp.solutions.holistic.Holistic(
+        static_image_mode=True, # Process frame by frame
+        model_complexity=1,     # 0, 1, or 2. Higher = more accurate but slower.
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5)
 
-def process_dataset(split):
-    """Processes all videos in a given split (train, dev, test)."""
+
+def _init_worker():
+    global _worker_holistic
+    cv2.setNumThreads(1) # Parallelism comes from the worker processes
+    _worker_holistic = _create_dataset_holistic()
+
+
+def save_keypoints_atomic(target_keypoint_file, keypoints):
+    """Writes the .npy next to its final path, then renames it: an interrupted run never leaves a partial file."""
+    tmp_file = f"{target_keypoint_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            np.save(f, keypoints)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, target_keypoint_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def _process_video(holistic, video_name, source_frame_dir_base, target_keypoint_dir_base):
+    """
+    Extracts and saves the keypoints of one video.
+    Returns:
+        (str, str, int): video name, status ('processed', 'skipped' or 'error'), number of frames.
+    """
+    video_frame_folder = os.path.join(source_frame_dir_base, video_name)
+    target_keypoint_folder = os.path.join(target_keypoint_dir_base, video_name)
+    target_keypoint_file = os.path.join(target_keypoint_folder, "keypoints.npy")
+
+    if not os.path.isdir(video_frame_folder):
+        return video_name, 'skipped', 0
+
+    frame_files = sorted([f for f in os.listdir(video_frame_folder) if f.endswith(('.png', '.jpg', '.jpeg'))])
+    if not frame_files:
+        return video_name, 'skipped', 0
+
+    try:
+        # Unreadable frames come through as None and are stored as zeros
+        frames = (cv2.imread(os.path.join(video_frame_folder, frame_file)) for frame_file in frame_files)
+        # Shape should be (T, TOTAL_LANDMARKS, NUM_COORDS), e.g. (T, 127, 3)
+        final_keypoints, frames_processed_in_video = extract_video_keypoints(holistic, frames, len(frame_files))
+        if frames_processed_in_video == 0:
+            return video_name, 'skipped', 0
+
+        os.makedirs(target_keypoint_folder, exist_ok=True)
+        save_keypoints_atomic(target_keypoint_file, final_keypoints)
+        return video_name, 'processed', len(final_keypoints)
+
+    except Exception as e:
+        print(f"\nERROR processing video {video_name}: {e}")
+        import traceback
+        traceback.print_exc() # Print full traceback for debugging
+        return video_name, 'error', 0
+
+
+def _process_video_in_worker(args):
+    return _process_video(_worker_holistic, *args)
+
+
+def load_manifest(manifest_path):
+    """
+    Reads the per-split manifest (one JSON line per finished video) and returns {video_name: entry}
+    for the entries written with the current EXTRACTION_FINGERPRINT. A torn last line
+    (run killed mid-write) is ignored, that video is simply redone.
+    """
+    entries = {}
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get('fingerprint') == EXTRACTION_FINGERPRINT:
+                entries[entry['name']] = entry
+    return entries
+
+
+def process_dataset(split, num_workers=1, chunksize=4):
+    """
+    Processes all videos in a given split (train, dev, test).
+    With num_workers > 1 the videos are sharded across worker processes, each with its own
+    Holistic instance (chunksize videos are handed to a worker at a time).
+    Every finished video is appended to {KEYPOINT_PATH}/{split}/_manifest.jsonl by the parent
+    process only; a rerun skips the videos recorded there (processed or without frames), so an
+    interrupted run resumes exactly where it stopped. Errors are not recorded and are retried.
+    """
     print(f"\n--- Processing split: {split} ---")
 
     # Get list of video names from annotation file for the split
@@ -162,114 +330,71 @@ def process_dataset(split):
 
     source_frame_dir_base = os.path.join(config.VIDEO_PATH, split)
     target_keypoint_dir_base = os.path.join(config.KEYPOINT_PATH, split) # Use KEYPOINT_PATH from config
+    os.makedirs(target_keypoint_dir_base, exist_ok=True)
+    manifest_path = os.path.join(target_keypoint_dir_base, MANIFEST_FILENAME)
 
-    # Initialize MediaPipe Holistic
-    mp_holistic = mp.solutions.holistic
-    holistic = mp_holistic.Holistic(
-        static_image_mode=True, # Process frame by frame
-        model_complexity=1,     # 0, 1, or 2. Higher = more accurate but slower.
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5)
-
-    processed_count = 0
-    skipped_count = 0
-    error_count = 0
+    manifest = load_manifest(manifest_path)
     already_exist_count = 0
-
-    for video_name in tqdm(video_names, desc=f"Processing {split} videos"):
-        video_frame_folder = os.path.join(source_frame_dir_base, video_name)
-        target_keypoint_folder = os.path.join(target_keypoint_dir_base, video_name)
-        target_keypoint_file = os.path.join(target_keypoint_folder, "keypoints.npy")
-
-        # Skip if already processed
-        if os.path.exists(target_keypoint_file):
+    pending = []
+    for video_name in video_names:
+        entry = manifest.get(video_name)
+        target_keypoint_file = os.path.join(target_keypoint_dir_base, video_name, "keypoints.npy")
+        if entry is not None and (entry['status'] == 'skipped' or os.path.exists(target_keypoint_file)):
             already_exist_count += 1
-            continue
-
-        if not os.path.isdir(video_frame_folder):
-            # print(f"Warning: Frame folder not found for {video_name} at {video_frame_folder}, skipping.")
-            skipped_count += 1
-            continue
-
-        frame_files = sorted([f for f in os.listdir(video_frame_folder) if f.endswith(('.png', '.jpg', '.jpeg'))])
-        if not frame_files:
-            # print(f"Warning: No frames found in {video_frame_folder}, skipping.")
-            skipped_count += 1
-            continue
-
-        video_keypoints_normalized = [] # List to hold normalized landmarks for each frame
-        frames_processed_in_video = 0
-
-        try:
-            for frame_file in frame_files:
-                frame_path = os.path.join(video_frame_folder, frame_file)
-                img = cv2.imread(frame_path)
-                if img is None:
-                    # print(f"Warning: Could not read frame {frame_path}, skipping frame.")
-                    # Append zeros if a frame fails? Better to skip if normalization needs shoulders?
-                    # If we append zeros here, normalize_frame_keypoints will handle it.
-                    video_keypoints_normalized.append(np.zeros((TOTAL_LANDMARKS, NUM_COORDS), dtype=np.float32))
-                    continue
-
-                # Process with MediaPipe
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                img_rgb.flags.writeable = False # Performance boost
-                results = holistic.process(img_rgb)
-                img_rgb.flags.writeable = True
-
-                # Extract *selected* landmarks for the frame
-                frame_landmarks_raw = extract_landmarks_from_results(results) # Gets the (127, 3) array
-
-                # Normalize the extracted landmarks (using shoulder points from the raw array)
-                frame_landmarks_norm = normalize_frame_keypoints(frame_landmarks_raw)
-
-                video_keypoints_normalized.append(frame_landmarks_norm)
-                frames_processed_in_video += 1
-
-            # Stack all normalized frame landmarks into a single array for the video
-            if not video_keypoints_normalized or frames_processed_in_video == 0:
-                 # print(f"Warning: No frames processed successfully for {video_name}, skipping save.")
-                 skipped_count += 1
-                 continue
-
-            # Shape should be (T, TOTAL_LANDMARKS, NUM_COORDS), e.g. (T, 127, 3)
-            final_keypoints = np.stack(video_keypoints_normalized, axis=0)
-
-            os.makedirs(target_keypoint_folder, exist_ok=True)
-
-            # Save the normalized keypoints
-            np.save(target_keypoint_file, final_keypoints)
-            processed_count += 1
-
-        except Exception as e:
-            print(f"\nERROR processing video {video_name}: {e}")
-            import traceback
-            traceback.print_exc() # Print full traceback for debugging
-            error_count += 1
-            if os.path.exists(target_keypoint_file):
-                 try:
-                     os.remove(target_keypoint_file)
-                 except OSError:
-                     pass
-
-    holistic.close()
+        else:
+            pending.append((video_name, source_frame_dir_base, target_keypoint_dir_base))
+    print(f"Resuming from manifest: {already_exist_count} done, {len(pending)} to process "
+          f"(fingerprint {EXTRACTION_FINGERPRINT}).")
+
+    counts = {'processed': 0, 'skipped': 0, 'error': 0}
+    with open(manifest_path, 'a', encoding='utf-8') as manifest_file:
+        def record(result):
+            video_name, status, num_frames = result
+            counts[status] += 1
+            if status != 'error':
+                manifest_file.write(json.dumps({
+                    'name': video_name, 'status': status, 'frames': num_frames,
+                    'fingerprint': EXTRACTION_FINGERPRINT,
+                }) + "\n")
+                manifest_file.flush()
+                os.fsync(manifest_file.fileno())
+
+        if num_workers <= 1:
+            holistic = _create_dataset_holistic()
+            try:
+                for args in tqdm(pending, desc=f"Processing {split} videos"):
+                    record(_process_video(holistic, *args))
+            finally:
+                holistic.close()
+        else:
+            # spawn: MediaPipe/TFLite threads do not survive fork, each worker builds its graph from scratch
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(processes=num_workers, initializer=_init_worker) as pool:
+                results = pool.imap_unordered(_process_video_in_worker, pending, chunksize=max(int(chunksize), 1))
+                for result in tqdm(results, total=len(pending), desc=f"Processing {split} videos ({num_workers} workers)"):
+                    record(result)
+
     print(f"--- Finished split: {split} ---")
     print(f"  Already Existed: {already_exist_count}")
-    print(f"  Successfully Processed (New): {processed_count}")
-    print(f"  Skipped (No frames/folder): {skipped_count}")
-    print(f"  Errors during processing: {error_count}")
+    print(f"  Successfully Processed (New): {counts['processed']}")
+    print(f"  Skipped (No frames/folder): {counts['skipped']}")
+    print(f"  Errors during processing: {counts['error']}")
 
 # --- Run Processing ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract MediaPipe Holistic keypoints for the PHOENIX-2014-T splits.")
+    parser.add_argument("--splits", nargs="+", default=["train", "dev", "test"], help="Splits to process.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (1 = serial, in this process).")
+    parser.add_argument("--chunksize", type=int, default=4, help="Videos handed to a worker at a time.")
+    args = parser.parse_args()
+
     if not os.path.exists(config.KEYPOINT_PATH):
         os.makedirs(config.KEYPOINT_PATH, exist_ok=True)
         print(f"Created keypoint base directory: {config.KEYPOINT_PATH}")
     else:
         print(f"Using existing keypoint base directory: {config.KEYPOINT_PATH}")
 
-    # Process train, dev, and test sets
-    process_dataset("train")
-    process_dataset("dev")
-    process_dataset("test")
+    for split in args.splits:
+        process_dataset(split, num_workers=args.workers, chunksize=args.chunksize)
 
-    print("\n--- Keypoint Extraction Complete (Using Selected Face Landmarks) ---")
\ No newline at end of file
+    print("\n--- Keypoint Extraction Complete (Using Selected Face Landmarks) ---")
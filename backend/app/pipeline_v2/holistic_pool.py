@@ -0,0 +1,142 @@
+# holistic_pool.py
+import threading
+import time
+from contextlib import contextmanager
+
+import mediapipe as mp
+
+
+class HolisticPoolTimeout(RuntimeError):
+    """Raised when no Holistic graph could be checked out within the pool timeout."""
+    pass
+
+
+class HolisticPool:
+    """
+    Thread-safe pool of MediaPipe Holistic graphs for the V2 pipeline.
+    A graph is checked out for a whole video, so it can run in tracking mode
+    (static_image_mode=False): palm/face detection only runs when tracking is lost
+    instead of on every frame. The graph is reset before going back to the pool so
+    no tracking state leaks into the next task, and concurrent tasks never call
+    .process() on the same graph (which is not thread-safe).
+    Graphs are created lazily, up to `size`; when all are busy, callers wait up to
+    `timeout` seconds. stats() reports utilization and wait times to size the pool.
+    """
+    def __init__(self, size: int = 2, timeout: float = None, **holistic_kwargs):
+        self.size = max(int(size), 1)
+        self.timeout = timeout
+        self.holistic_kwargs = holistic_kwargs
+        self._cond = threading.Condition()
+        self._idle = []
+        self._created = 0
+        self._checked_out_at = {} # id(graph) -> checkout time
+        # Metrics
+        self._started_at = time.monotonic()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._peak_in_use = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._busy_time = 0.0
+
+    def _new_graph(self):
+        return mp.solutions.holistic.Holistic(**self.holistic_kwargs)
+
+    def acquire(self, timeout: float = None):
+        """
+        Checks out a graph: an idle one, else a new one if the pool is not full, else waits.
+        Raises HolisticPoolTimeout if nothing is available after `timeout` (default: pool timeout).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        holistic = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    holistic = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._timeouts += 1
+                    raise HolisticPoolTimeout(
+                        f"No MediaPipe Holistic graph available after {timeout:.1f}s (pool size {self.size}).")
+                self._cond.wait(remaining)
+
+        if holistic is None:
+            try:
+                holistic = self._new_graph()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        now = time.monotonic()
+        waited = now - start
+        with self._cond:
+            self._checked_out_at[id(holistic)] = now
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            self._peak_in_use = max(self._peak_in_use, len(self._checked_out_at))
+        return holistic
+
+    def release(self, holistic):
+        """Resets a graph's tracking state and puts it back in the pool."""
+        try:
+            holistic.reset()
+            reusable = True
+        except Exception as e:
+            # A graph that cannot be reset is dropped, a new one will be created on demand.
+            print(f"Warning: Could not reset MediaPipe Holistic graph, discarding it: {e}")
+            holistic.close()
+            reusable = False
+
+        with self._cond:
+            checked_out_at = self._checked_out_at.pop(id(holistic), None)
+            if checked_out_at is not None:
+                self._busy_time += time.monotonic() - checked_out_at
+            if reusable:
+                self._idle.append(holistic)
+            else:
+                self._created -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout: float = None):
+        """with pool.session() as holistic: ... -- one graph for the frames of one video."""
+        holistic = self.acquire(timeout)
+        try:
+            yield holistic
+        finally:
+            self.release(holistic)
+
+    def stats(self) -> dict:
+        """Pool metrics: utilization is the share of graph-seconds spent checked out since start."""
+        with self._cond:
+            now = time.monotonic()
+            busy_time = self._busy_time + sum(now - t for t in self._checked_out_at.values())
+            elapsed = max(now - self._started_at, 1e-9)
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': len(self._checked_out_at),
+                'idle': len(self._idle),
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'avg_wait_ms': 1000.0 * self._total_wait / self._checkouts if self._checkouts else 0.0,
+                'max_wait_ms': 1000.0 * self._max_wait,
+                'utilization': busy_time / (self.size * elapsed),
+            }
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for holistic in idle:
+            holistic.close()
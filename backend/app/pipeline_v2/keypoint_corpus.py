@@ -0,0 +1,200 @@
+# keypoint_corpus.py
+"""
+Packed keypoint corpus: every video of a split in one contiguous memmap instead of one small
+.npy per video folder (the layout written by extract_keypoints.process_dataset).
+
+On disk, a corpus is a directory with:
+    data.bin   -- raw (total_frames, *frame_shape) array, float32 or float16, C order
+    index.npy  -- (num_samples, 2) int64 array of (frame offset, length)
+    meta.json  -- dtype, frame_shape, total_frames, the sample names in index order and
+                  an optional metadata dict per sample (split, gloss sequence, ...)
+
+meta.json is written last, so a corpus whose writer did not finish is never opened.
+
+Usage:
+    python -m app.pipeline_v2.keypoint_corpus --source <KEYPOINT_PATH>/train --output <dir>/train.corpus
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+DATA_FILENAME = "data.bin"
+INDEX_FILENAME = "index.npy"
+META_FILENAME = "meta.json"
+SUPPORTED_DTYPES = ("float32", "float16")
+
+
+class KeypointCorpusWriter:
+    """
+    Appends per-video keypoint arrays (T, *frame_shape) to a new corpus.
+    Samples are streamed to data.bin as they come, only the index stays in memory.
+
+        with KeypointCorpusWriter(path, dtype="float16") as writer:
+            writer.append(video_name, keypoints)
+    """
+    def __init__(self, path: str, dtype: str = "float32", frame_shape: tuple = None):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported corpus dtype '{dtype}', expected one of {SUPPORTED_DTYPES}.")
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILENAME)
+        if os.path.exists(meta_path):
+            os.remove(meta_path) # The corpus is invalid until close() rewrites it
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.frame_shape = tuple(frame_shape) if frame_shape is not None else None
+        self.names = []
+        self.offsets = []
+        self.lengths = []
+        self.metadata = []
+        self.total_frames = 0
+        self._data_file = open(os.path.join(path, DATA_FILENAME), 'wb')
+
+    def append(self, name: str, keypoints: np.ndarray, metadata: dict = None):
+        """Adds one sample (with optional JSON-serializable metadata). All samples must share the same per-frame shape."""
+        keypoints = np.asarray(keypoints)
+        if keypoints.ndim < 2:
+            raise ValueError(f"Sample '{name}' must be (T, ...) shaped, got {keypoints.shape}.")
+        if self.frame_shape is None:
+            self.frame_shape = keypoints.shape[1:]
+        elif keypoints.shape[1:] != self.frame_shape:
+            raise ValueError(f"Sample '{name}' has frame shape {keypoints.shape[1:]}, corpus expects {self.frame_shape}.")
+
+        np.ascontiguousarray(keypoints, dtype=self.dtype).tofile(self._data_file)
+        self.names.append(name)
+        self.offsets.append(self.total_frames)
+        self.lengths.append(len(keypoints))
+        self.metadata.append(metadata or {})
+        self.total_frames += len(keypoints)
+
+    def close(self):
+        """Flushes the data and writes the index, then the metadata."""
+        if self._data_file is None:
+            return
+        self._data_file.flush()
+        os.fsync(self._data_file.fileno())
+        self._data_file.close()
+        self._data_file = None
+
+        index = np.stack([np.asarray(self.offsets, dtype=np.int64), np.asarray(self.lengths, dtype=np.int64)], axis=1) \
+            if self.names else np.zeros((0, 2), dtype=np.int64)
+        np.save(os.path.join(self.path, INDEX_FILENAME), index)
+
+        meta = {
+            'dtype': self.dtype.name,
+            'frame_shape': list(self.frame_shape or ()),
+            'total_frames': self.total_frames,
+            'names': self.names,
+            'metadata': self.metadata,
+        }
+        meta_path = os.path.join(self.path, META_FILENAME)
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._data_file is not None:
+            # Leave no meta.json behind: the partial corpus stays unreadable
+            self._data_file.close()
+            self._data_file = None
+
+
+class KeypointCorpus:
+    """
+    Read-only view over a packed corpus. Samples are returned as zero-copy slices of the
+    memmap (cast with np.asarray(..., dtype=np.float32) when a float32 copy is needed).
+    Indexable by position or by video name.
+    """
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, META_FILENAME)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No keypoint corpus at {path} (missing {META_FILENAME}).")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        self.path = path
+        self.dtype = np.dtype(meta['dtype'])
+        self.frame_shape = tuple(meta['frame_shape'])
+        self.names = meta['names']
+        self.metadata = meta.get('metadata') or [{} for _ in self.names]
+        self.index = np.load(os.path.join(path, INDEX_FILENAME))
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+        total_frames = meta['total_frames']
+        if total_frames > 0:
+            self.data = np.memmap(os.path.join(path, DATA_FILENAME), dtype=self.dtype, mode='r',
+                                  shape=(total_frames,) + self.frame_shape)
+        else:
+            self.data = np.zeros((0,) + self.frame_shape, dtype=self.dtype)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.index[:, 1]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def position_of(self, key) -> int:
+        return self._positions[key] if isinstance(key, str) else int(key)
+
+    def metadata_of(self, key) -> dict:
+        return self.metadata[self.position_of(key)]
+
+    def __getitem__(self, key) -> np.ndarray:
+        offset, length = self.index[self.position_of(key)]
+        return self.data[offset:offset + length]
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self.names[position], self[position]
+
+
+def convert_directory(source_dir: str, output_dir: str, dtype: str = "float32",
+                      filename: str = "keypoints.npy", names: list = None) -> int:
+    """
+    Packs a per-video layout (source_dir/<video_name>/<filename>) into a corpus.
+    Args:
+        source_dir: Folder with one sub-folder per video (e.g. KEYPOINT_PATH/train).
+        output_dir: Corpus directory to create.
+        dtype: Storage dtype, 'float32' or 'float16'.
+        filename: Per-video file name ('keypoints.npy' for V2, 'keypoints_v2.npy' for V1 exports).
+        names: Optional list of video names (order kept); defaults to every sub-folder, sorted.
+    Returns:
+        int: Number of samples written. Videos without the file are skipped.
+    """
+    if names is None:
+        names = sorted(entry for entry in os.listdir(source_dir) if os.path.isdir(os.path.join(source_dir, entry)))
+
+    missing = 0
+    with KeypointCorpusWriter(output_dir, dtype=dtype) as writer:
+        for name in tqdm(names, desc=f"Packing {source_dir}"):
+            sample_path = os.path.join(source_dir, name, filename)
+            if not os.path.exists(sample_path):
+                missing += 1
+                continue
+            writer.append(name, np.load(sample_path, mmap_mode='r'))
+        written = len(writer.names)
+
+    print(f"Packed {written} samples ({writer.total_frames} frames, {dtype}) into {output_dir}. Missing: {missing}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack per-video keypoint .npy files into a memory-mapped corpus.")
+    parser.add_argument("--source", required=True, help="Folder with one sub-folder per video.")
+    parser.add_argument("--output", required=True, help="Corpus directory to write.")
+    parser.add_argument("--dtype", default="float32", choices=SUPPORTED_DTYPES)
+    parser.add_argument("--filename", default="keypoints.npy", help="Per-video keypoint file name.")
+    args = parser.parse_args()
+
+    convert_directory(args.source, args.output, dtype=args.dtype, filename=args.filename)
@@ -1,25 +1,28 @@
 import os
-import glob
+import math
+import time
 import numpy as np
 import torch
 import cv2
 from torchvision import transforms
 from transformers import AutoTokenizer
-from huggingface_hub import hf_hub_download
 
 # Imports from within pipeline_v2
 from . import config as v2_config # Important: uses the config within pipeline_v2
 from .model import TwoStreamSLRModel
 from .model_translator import GlossToTextTranslatorT5
 from .vocabulary import Vocabulary as GlossVocabularyV2
-from .utils import ctc_decode_greedy, load_checkpoint as load_checkpoint_v2
-from app.ai_pipeline import text_translation
+from .utils import ctc_decode_greedy, ctc_decode_beam, load_checkpoint as load_checkpoint_v2
+from app.ai_pipeline import text_translation, fetch_checkpoint, fetch_file
+from app.frame_source import sample_frame_indices
+from app.POC2.SLR.gloss_lm import GlossNGramLM
+from app.generation import BatchedGenerator, LatencyByLength
+from app.model_registry import REGISTRY
 
 # For keypoint extraction (logic adapted from pipeline_v2.extract_keypoints.py)
-import mediapipe as mp
+from .holistic_pool import HolisticPool
 from .extract_keypoints import (
-    extract_landmarks_from_results, 
-    normalize_frame_keypoints,
+    extract_video_keypoints,
     TOTAL_LANDMARKS as V2_TOTAL_LANDMARKS, # Use constants from extract_keypoints
     NUM_COORDS as V2_NUM_COORDS
 )
@@ -40,146 +43,164 @@ def get_v2_transforms(): # Based on dataset.py from V2 project
         transforms.Normalize(mean=v2_config.RGB_MEAN, std=v2_config.RGB_STD)
     ])
 
-def load_v2_models():
-    """Load Pipeline V2 models into memory."""
-    print("Pre-loading Pipeline V2 AI models from Hugging Face...")
-    device = torch.device(v2_config.DEVICE)
-    MODELS_V2['device'] = device
-
-    # 1. V2 Gloss Vocabulary (on peut le garder local)
+def load_gloss_vocab_v2():
+    """V2 Gloss Vocabulary, and the optional gloss LM of the CTC beam search."""
+    # (on peut le garder local)
     v2_gloss_vocab_path = os.path.join(PIPELINE_V2_DIR, 'assets', 'data', 'phoenix_gloss.vocab')
     if not os.path.exists(v2_gloss_vocab_path):
-        # Alternative : le télécharger aussi depuis le Hub
-        print(f"Downloading V2 gloss vocab from {HF_REPO_ID}...")
-        v2_gloss_vocab_path = hf_hub_download(
-            repo_id=HF_REPO_ID,
-            filename="POC1/data/phoenix_gloss.vocab" # En supposant que vous l'ayez nommé POC1
-        )
+        # Alternative : le récupérer depuis le Hub (artifact store local : téléchargé une seule fois)
+        v2_gloss_vocab_path = fetch_file("POC1/data/phoenix_gloss.vocab") # En supposant que vous l'ayez nommé POC1
     MODELS_V2['gloss_vocab_v2'] = GlossVocabularyV2(v2_gloss_vocab_path)
     print(f"Pipeline V2: Gloss Vocabulary loaded (size: {len(MODELS_V2['gloss_vocab_v2'])})")
 
-    # 2. V2 SLR Model (TwoStreamSLRModel)
+    if v2_config.CTC_LM_PATH:
+        MODELS_V2['gloss_lm_v2'] = GlossNGramLM.load(v2_config.CTC_LM_PATH).bind(MODELS_V2['gloss_vocab_v2'].idx2word)
+        print("Pipeline V2: Gloss LM loaded.")
+
+
+def load_slr_model_v2():
+    """V2 SLR Model (TwoStreamSLRModel), sized on the gloss vocabulary."""
+    device = MODELS_V2['device']
     slr_model_v2 = TwoStreamSLRModel(gloss_vocab_size=len(MODELS_V2['gloss_vocab_v2'])).to(device)
     
-    print(f"Downloading V2 SLR model from {HF_REPO_ID}...")
-    slr_checkpoint_path_v2 = hf_hub_download(
-        repo_id=HF_REPO_ID,
-        filename="POC1/checkpoints_slr_ctc/twostream_best_epoch_067_wer31.12.pth"
-    )
+    # Artifact-store folder (weights-only safetensors) or downloaded checkpoint
+    slr_checkpoint_path_v2 = fetch_checkpoint("POC1/checkpoints_slr_ctc/twostream_best_epoch_067_wer31.12.pth")
     
     load_checkpoint_v2(slr_checkpoint_path_v2, slr_model_v2)
     slr_model_v2.eval()
     MODELS_V2['slr_model_v2'] = slr_model_v2
     print("Pipeline V2: TwoStreamSLRModel loaded.")
 
-    # 3. V2 Text Tokenizer (for T5) & T5 Translator Model
-    MODELS_V2['text_tokenizer_v2'] = AutoTokenizer.from_pretrained(v2_config.TRANSLATOR_MODEL_NAME)
+
+def load_translator_model_v2():
+    """V2 Text Tokenizer (for T5) & T5 Translator Model."""
+    device = MODELS_V2['device']
+    text_tokenizer_v2 = AutoTokenizer.from_pretrained(v2_config.TRANSLATOR_MODEL_NAME)
     
     translator_model_v2 = GlossToTextTranslatorT5(model_name_or_path=v2_config.TRANSLATOR_MODEL_NAME).to(device)
 
-    print(f"Downloading V2 Translator model from {HF_REPO_ID}...")
-    translator_checkpoint_path_v2 = hf_hub_download(
-        repo_id=HF_REPO_ID,
-        filename="POC1/checkpoints_translator_t5/translator_checkpoint_epoch_019.pth"
-    )
+    translator_checkpoint_path_v2 = fetch_checkpoint("POC1/checkpoints_translator_t5/translator_checkpoint_epoch_019.pth")
 
     load_checkpoint_v2(translator_checkpoint_path_v2, translator_model_v2)
     translator_model_v2.eval()
+    # Concurrent tasks share one T5 generate() (micro-batching, inputs padded to the longest)
+    MODELS_V2['t5_generator'] = BatchedGenerator(
+        translator_model_v2, text_tokenizer_v2, device,
+        v2_config.T5_BATCH_MAX_SIZE, v2_config.T5_BATCH_MAX_WAIT_MS,
+        max_input_length=v2_config.MAX_GLOSS_SEQ_LEN, name='t5-v2'
+    )
+    MODELS_V2['t5_latency'] = LatencyByLength()
+    MODELS_V2['text_tokenizer_v2'] = text_tokenizer_v2
     MODELS_V2['translator_model_v2'] = translator_model_v2
     print("Pipeline V2: GlossToTextTranslatorT5 loaded.")
 
-    # 4. MediaPipe Holistic Model
-    MODELS_V2['holistic_mp'] = mp.solutions.holistic.Holistic(
-        static_image_mode=True, model_complexity=1,
+
+def load_holistic_pool():
+    """MediaPipe Holistic Models (one tracking-mode graph per running task) and the V2 frame transforms."""
+    MODELS_V2['holistic_pool'] = HolisticPool(
+        size=v2_config.HOLISTIC_POOL_SIZE, timeout=v2_config.HOLISTIC_POOL_TIMEOUT,
+        static_image_mode=v2_config.HOLISTIC_STATIC_IMAGE_MODE, model_complexity=v2_config.HOLISTIC_MODEL_COMPLEXITY,
         min_detection_confidence=0.5, min_tracking_confidence=0.5
     )
-    print("Pipeline V2: MediaPipe Holistic model initialized.")
+    print(f"Pipeline V2: MediaPipe Holistic pool initialized (size: {v2_config.HOLISTIC_POOL_SIZE}).")
     
-    # 5. V2 Frame Transforms
     MODELS_V2['v2_transforms'] = get_v2_transforms()
     print("Pipeline V2: Frame transforms initialized.")
 
 
-def extract_keypoints_v2_mediapipe(video_frames_dir: str, task_temp_dir: str) -> str:
-    """Extracts and normalizes keypoints using MediaPipe, saves them."""
-    print(f"Pipeline V2: Extracting MediaPipe keypoints from {video_frames_dir}")
-    keypoints_output_file = os.path.join(task_temp_dir, 'keypoints_v2.npy')
-    
-    holistic = MODELS_V2['holistic_mp']
-    image_paths = sorted(glob.glob(os.path.join(video_frames_dir, '*.jpg')))
-    if not image_paths:
-        raise FileNotFoundError(f"No frames found in {video_frames_dir} for V2 keypoint extraction.")
-
-    video_keypoints_normalized_list = []
-    for img_path in image_paths:
-        img = cv2.imread(img_path)
-        if img is None: continue
-        
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img_rgb.flags.writeable = False
-        results = holistic.process(img_rgb)
-        
-        frame_landmarks_raw = extract_landmarks_from_results(results) # From .extract_keypoints
-        frame_landmarks_norm = normalize_frame_keypoints(frame_landmarks_raw) # From .extract_keypoints
-        video_keypoints_normalized_list.append(frame_landmarks_norm)
+# Synthetic warm-up inferences, run once after a preload
+@torch.no_grad()
+def warm_up_slr_model_v2():
+    device = MODELS_V2['device']
+    frames = torch.zeros(1, 3, v2_config.NUM_FRAMES, *v2_config.IMG_SIZE, device=device) # (B, C, T_in, H, W)
+    keypoints = torch.zeros(1, v2_config.NUM_FRAMES, v2_config.KEYPOINT_INPUT_DIM, device=device)
+    MODELS_V2['slr_model_v2'](frames, keypoints)
+
+
+def warm_up_translator_model_v2():
+    MODELS_V2['t5_generator'](v2_config.T5_PREFIX_GLOSS_TO_GERMAN + "HEUTE WETTER", max_new_tokens=t5_decoding_budget(4),
+                              num_beams=v2_config.TRANSLATOR_BEAM_SIZE, early_stopping=True)
 
-    if not video_keypoints_normalized_list:
+
+def warm_up_holistic_pool():
+    # Creates the first graph and runs its detectors once
+    with MODELS_V2['holistic_pool'].session() as holistic:
+        holistic.process(np.zeros((480, 640, 3), dtype=np.uint8))
+
+
+# Models are loaded on first use by the V2 pipeline (or at startup with Config.PRELOAD_PIPELINES);
+# NLLB ('text_translator') is registered by ai_pipeline and loaded on demand by text_translation().
+MODELS_V2['device'] = torch.device(v2_config.DEVICE)
+REGISTRY.register('gloss_vocab_v2', load_gloss_vocab_v2, pipelines=('v2',))
+REGISTRY.register('slr_model_v2', load_slr_model_v2, pipelines=('v2',), depends_on=('gloss_vocab_v2',), warmup=warm_up_slr_model_v2)
+REGISTRY.register('translator_model_v2', load_translator_model_v2, pipelines=('v2',), warmup=warm_up_translator_model_v2)
+REGISTRY.register('holistic_pool', load_holistic_pool, pipelines=('v2',), warmup=warm_up_holistic_pool)
+
+
+def load_v2_models():
+    """Load Pipeline V2 models into memory."""
+    REGISTRY.load_pipeline('v2')
+
+
+def extract_keypoints_v2_mediapipe(frame_store) -> np.ndarray:
+    """
+    Extracts and normalizes keypoints using MediaPipe on the decoded frames of a FrameStore.
+    Returns:
+        np.ndarray: (T, V2_TOTAL_LANDMARKS, V2_NUM_COORDS) normalized keypoints.
+    """
+    print(f"Pipeline V2: Extracting MediaPipe keypoints from {len(frame_store)} decoded frames")
+    if len(frame_store) == 0:
+        raise ValueError("No frames available for V2 keypoint extraction.")
+
+    # The graph is kept for the whole video (tracking mode) and reset when handed back to the pool.
+    with MODELS_V2['holistic_pool'].session() as holistic:
+        # Landmarks are gathered into a (T, V2_TOTAL_LANDMARKS, V2_NUM_COORDS) buffer and normalized in one pass
+        keypoints, processed = extract_video_keypoints(holistic, frame_store, len(frame_store))
+
+    if processed == 0:
         raise ValueError("No keypoints extracted with MediaPipe.")
+    return keypoints
 
-    stacked_keypoints = np.stack(video_keypoints_normalized_list, axis=0)
-    # Expected shape (T, V2_TOTAL_LANDMARKS, V2_NUM_COORDS)
-    
-    np.save(keypoints_output_file, stacked_keypoints)
-    print(f"Pipeline V2: MediaPipe keypoints saved to {keypoints_output_file}")
-    return keypoints_output_file
+def t5_decoding_budget(num_gloss_tokens: int) -> int:
+    """max_new_tokens of the T5 translation for a gloss prompt of `num_gloss_tokens` tokens."""
+    budget = v2_config.T5_LENGTH_RATIO * num_gloss_tokens + v2_config.T5_LENGTH_MARGIN
+    budget = 8 * math.ceil(budget / 8)
+    return int(min(max(budget, v2_config.T5_MIN_NEW_TOKENS), v2_config.MAX_TEXT_SEQ_LEN + 10))
 
 @torch.no_grad()
-def run_translation_pipeline_v2(video_frames_dir: str, task_temp_dir: str,targetLang: str) -> dict:
-    """Runs the complete Pipeline V2."""
+def run_translation_pipeline_v2(frame_store, task_temp_dir: str,targetLang: str) -> dict:
+    """
+    Runs the complete Pipeline V2.
+    Args:
+        frame_store: FrameStore holding the video decoded once; both the MediaPipe stage
+                     and the RGB stage read from it.
+        task_temp_dir: The unique folder for this task.
+    """
+    REGISTRY.load_pipeline('v2') # No-op once the V2 models are loaded
     device = MODELS_V2['device']
     
     # 1. Keypoint Extraction (MediaPipe)
-    keypoints_v2_file = extract_keypoints_v2_mediapipe(video_frames_dir, task_temp_dir)
-    all_keypoints_v2_raw = np.load(keypoints_v2_file) # (Actual_T, V2_TOTAL_LANDMARKS, V2_NUM_COORDS)
+    all_keypoints_v2_raw = extract_keypoints_v2_mediapipe(frame_store) # (Actual_T, V2_TOTAL_LANDMARKS, V2_NUM_COORDS)
     
     # Flatten keypoints for SLR model: (Actual_T, V2_TOTAL_LANDMARKS * V2_NUM_COORDS)
     # V2_KEYPOINT_INPUT_DIM = V2_TOTAL_LANDMARKS * V2_NUM_COORDS
     # This should match v2_config.KEYPOINT_INPUT_DIM (381)
     all_keypoints_v2_flat = all_keypoints_v2_raw.reshape(all_keypoints_v2_raw.shape[0], -1)
 
-    # 2. Load RGB Frames and Apply Transforms
-    image_paths = sorted(glob.glob(os.path.join(video_frames_dir, '*.jpg')))
-    if not image_paths:
-        raise FileNotFoundError(f"No frames found in {video_frames_dir} for V2 frame loading.")
-    
-    all_frames_raw = []
-    for img_path in image_paths:
-        img = cv2.imread(img_path)
-        if img is None: continue
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        all_frames_raw.append(img_rgb)
-    
-    if not all_frames_raw:
+    # 2. RGB frames come from the same FrameStore (converted to RGB only for the sampled indices below)
+    if len(frame_store) == 0:
         raise ValueError("Could not load any frames for V2.")
 
     # 3. Temporal Subsampling/Padding for Frames and Keypoints (to v2_config.NUM_FRAMES)
-    actual_num_frames = len(all_frames_raw)
-    actual_num_keypoints_frames = all_keypoints_v2_flat.shape[0]
-
-    if actual_num_frames != actual_num_keypoints_frames:
-        print(f"Pipeline V2 Warning: Frame count ({actual_num_frames}) and keypoint frame count ({actual_num_keypoints_frames}) mismatch. Using minimum.")
-        min_len = min(actual_num_frames, actual_num_keypoints_frames)
-        if min_len == 0: raise ValueError("Zero length after frame/keypoint sync for V2.")
-        all_frames_raw = all_frames_raw[:min_len]
-        all_keypoints_v2_flat = all_keypoints_v2_flat[:min_len]
-        actual_num_frames = min_len
-    elif actual_num_frames == 0:
+    # Indices are computed on the original video; a sampled FrameStore already holds exactly these frames.
+    actual_num_frames = frame_store.num_source_frames
+    if actual_num_frames == 0:
         raise ValueError("No frames or keypoints to process for V2.")
         
     target_num_input_frames = v2_config.NUM_FRAMES # e.g., 64
-    indices = np.linspace(0, actual_num_frames - 1, num=target_num_input_frames, dtype=int)
+    indices = frame_store.positions_of(sample_frame_indices(actual_num_frames, target_num_input_frames))
     
-    selected_raw_frames = [all_frames_raw[i] for i in indices]
+    selected_raw_frames = [cv2.cvtColor(frame_store[i], cv2.COLOR_BGR2RGB) for i in indices]
     selected_keypoints_flat = all_keypoints_v2_flat[indices]
 
     v2_transforms = MODELS_V2['v2_transforms']
@@ -225,35 +246,38 @@ def run_translation_pipeline_v2(video_frames_dir: str, task_temp_dir: str,target
         ensembled_log_probs = torch.log(ensembled_probs.clamp(min=1e-9))
         log_probs_ctc_pred = ensembled_log_probs.permute(1, 0, 2) # (Num_Windows=T_out, B, Vocab_Size)
 
-    predicted_gloss_strings_batch = ctc_decode_greedy(
-        log_probs_ctc_pred, 
-        input_lengths_ctc, 
-        MODELS_V2['gloss_vocab_v2']
-    )
+    gloss_lm_v2 = MODELS_V2.get('gloss_lm_v2')
+    if v2_config.CTC_BEAM_WIDTH > 1 or gloss_lm_v2 is not None:
+        predicted_gloss_strings_batch = ctc_decode_beam(
+            log_probs_ctc_pred,
+            input_lengths_ctc,
+            MODELS_V2['gloss_vocab_v2'],
+            beam_width=v2_config.CTC_BEAM_WIDTH,
+            lm=gloss_lm_v2,
+            lm_weight=v2_config.CTC_LM_WEIGHT,
+            insertion_bonus=v2_config.CTC_LM_INSERTION_BONUS
+        )
+    else:
+        predicted_gloss_strings_batch = ctc_decode_greedy(
+            log_probs_ctc_pred, 
+            input_lengths_ctc, 
+            MODELS_V2['gloss_vocab_v2']
+        )
     predicted_glosses_v2 = predicted_gloss_strings_batch[0] if predicted_gloss_strings_batch else ""
     print(f"Pipeline V2: Predicted glosses: '{predicted_glosses_v2}'")
 
-    # 5. Gloss Translation (T5)
-    translator_model_v2 = MODELS_V2['translator_model_v2']
-    text_tokenizer_v2 = MODELS_V2['text_tokenizer_v2']
-    
+    # 5. Gloss Translation (T5), batched with the concurrent tasks
+    # The prompt is not padded to MAX_GLOSS_SEQ_LEN and the decoding budget follows the gloss length
     input_text_for_t5 = v2_config.T5_PREFIX_GLOSS_TO_GERMAN + predicted_glosses_v2.upper()
-    tokenized_gloss_for_t5 = text_tokenizer_v2(
+    num_gloss_tokens = len(MODELS_V2['text_tokenizer_v2'](predicted_glosses_v2.upper(), add_special_tokens=False)['input_ids'])
+    t5_start = time.perf_counter()
+    predicted_text_v2 = MODELS_V2['t5_generator'](
         input_text_for_t5,
-        max_length=v2_config.MAX_GLOSS_SEQ_LEN,
-        padding="max_length", # Pad to max_length
-        truncation=True,
-        return_tensors="pt"
-    ).to(device)
-
-    generated_ids = translator_model_v2.generate(
-        input_ids=tokenized_gloss_for_t5.input_ids,
-        attention_mask=tokenized_gloss_for_t5.attention_mask,
-        max_length=v2_config.MAX_TEXT_SEQ_LEN + 10,
+        max_new_tokens=t5_decoding_budget(num_gloss_tokens),
         num_beams=v2_config.TRANSLATOR_BEAM_SIZE,
         early_stopping=True
     )
-    predicted_text_v2 = text_tokenizer_v2.decode(generated_ids[0], skip_special_tokens=True)
+    MODELS_V2['t5_latency'].record(num_gloss_tokens, time.perf_counter() - t5_start)
     print(f"Pipeline V2: Predicted text: '{predicted_text_v2}'")
     final_text_v2 = text_translation(predicted_text_v2,targetLang)
 
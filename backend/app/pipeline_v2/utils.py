@@ -8,6 +8,8 @@ from nltk.translate.meteor_score import meteor_score
 from rouge_score import rouge_scorer # pip install rouge-score
 import torch.nn.functional as F
 from . import config
+from app.POC2.SLR.ctc_decode import ctc_beam_search_decoder, ctc_greedy_decode_batch, ids_to_strings
+from app.artifact_store import load_artifact
 import os
 import numpy as np
 
@@ -77,7 +79,7 @@ def calculate_wer(predictions, targets, gloss_vocab):
 # --- NEW: CTC Greedy Decoding Function ---
 def ctc_decode_greedy(log_probs, input_lengths, gloss_vocab):
     """
-    Performs greedy CTC decoding (best path).
+    Performs greedy CTC decoding (best path), vectorized over the whole batch.
     Args:
         log_probs (Tensor): Log probabilities from the model (T, B, C).
         input_lengths (Tensor): Length of each sequence in the batch (B,).
@@ -85,28 +87,35 @@ def ctc_decode_greedy(log_probs, input_lengths, gloss_vocab):
     Returns:
         list[str]: List of decoded gloss sequences for the batch.
     """
-    decoded_batch = []
-    batch_size = log_probs.size(1)
-    blank_idx = gloss_vocab.blank_idx
+    token_ids, lengths = ctc_greedy_decode_batch(log_probs, input_lengths, gloss_vocab.blank_idx, time_major=True)
+    return ids_to_strings(token_ids, lengths, gloss_vocab.idx2word)
 
-    _, predicted_indices = torch.max(log_probs, dim=2)
 
-    for i in range(batch_size):
-        seq_len = input_lengths[i].item()
-        sequence_indices = predicted_indices[:seq_len, i].cpu().numpy()
-
-        decoded_sequence = []
-        last_idx = -1 
-        for idx in sequence_indices:
-            if idx != last_idx: 
-                if idx != blank_idx: 
-                    decoded_sequence.append(idx)
-            last_idx = idx 
-
-        decoded_str = gloss_vocab.decode(decoded_sequence, remove_special=False) 
-        decoded_batch.append(decoded_str)
-
-    return decoded_batch
+# --- CTC Beam Search Decoding (optional gloss LM fusion) ---
+def ctc_decode_beam(log_probs, input_lengths, gloss_vocab, beam_width=5, lm=None, lm_weight=0.5, insertion_bonus=0.0):
+    """
+    CTC prefix beam search, with optional shallow fusion of a gloss n-gram LM.
+    Args:
+        log_probs (Tensor): Log probabilities from the model (T, B, C).
+        input_lengths (Tensor): Length of each sequence in the batch (B,).
+        gloss_vocab (Vocabulary): Gloss vocabulary object.
+        beam_width (int): Beam size.
+        lm: Optional gloss LM bound to gloss_vocab (GlossNGramLM.bind(gloss_vocab.idx2word)).
+        lm_weight (float): LM weight.
+        insertion_bonus (float): Bonus per emitted gloss.
+    Returns:
+        list[str]: List of decoded gloss sequences for the batch.
+    """
+    decoded_ids = ctc_beam_search_decoder(
+        log_probs.permute(1, 0, 2), # (B, T, C)
+        input_lengths,
+        beam_width=beam_width,
+        blank_idx=gloss_vocab.blank_idx,
+        lm=lm,
+        lm_weight=lm_weight,
+        insertion_bonus=insertion_bonus
+    )
+    return [gloss_vocab.decode(ids, remove_special=False) for ids in decoded_ids]
 
 
 # --- Save/Load Checkpoints (Adapted for SLRModel) ---
@@ -135,7 +144,12 @@ def load_checkpoint(checkpoint_path, model, optimizer=None):
         # If utils.py is shared, this DEVICE might need to be passed or determined contextually
         device_to_load = config.DEVICE 
         print(f"Attempting to load checkpoint '{checkpoint_path}' to device '{device_to_load}'")
-        checkpoint = torch.load(checkpoint_path, map_location=device_to_load)
+        if os.path.isdir(checkpoint_path):
+            # Artifact-store folder (app/artifact_store.py): weights-only safetensors + metadata sidecar
+            groups, metadata = load_artifact(checkpoint_path, device_to_load)
+            checkpoint = dict(metadata, **groups)
+        else:
+            checkpoint = torch.load(checkpoint_path, map_location=device_to_load)
 
 
         saved_vocab_size_from_checkpoint = checkpoint.get('gloss_vocab_size') 
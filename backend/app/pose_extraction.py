@@ -0,0 +1,213 @@
+# backend/app/pose_extraction.py
+import numpy as np
+import torch
+from mmdet.apis import inference_detector
+from mmengine.dataset import Compose, pseudo_collate
+from mmengine.registry import init_default_scope
+
+# RTMPose wholebody predicts 133 keypoints; the 10 foot keypoints (14-23) are not used by the CTC model.
+NUM_WHOLEBODY_KEYPOINTS = 133
+KEPT_KEYPOINT_INDICES = np.array([i for i in range(NUM_WHOLEBODY_KEYPOINTS) if i not in range(14, 24)])
+NUM_KEPT_KEYPOINTS = len(KEPT_KEYPOINT_INDICES) # 123
+# Upper body (nose, eyes, ears, shoulders, elbows, wrists): always visible for a signer, used as tracking confidence.
+UPPER_BODY_KEYPOINT_INDICES = np.arange(0, 11)
+# Body + both hands: the part of the signer the crop must contain.
+TRACKED_KEYPOINT_INDICES = np.concatenate([np.arange(0, 13), np.arange(91, 133)])
+
+
+class BatchedPoseExtractor:
+    """
+    Runs the top-down pose model on several frames per forward pass.
+    mmpose.apis.inference_topdown only batches the boxes of a single image, so each
+    frame used to be a batch of size 1. Here the test pipeline (affine crop to 384x288)
+    is applied to N frames, the crops are collated together and sent through
+    model.test_step at once, exactly like inference_topdown does for one image.
+    """
+    def __init__(self, model, batch_size: int = 16):
+        self.model = model
+        self.batch_size = max(int(batch_size), 1)
+        scope = model.cfg.get('default_scope', 'mmpose')
+        if scope is not None:
+            init_default_scope(scope)
+        self.pipeline = Compose(model.cfg.test_dataloader.dataset.pipeline)
+
+    def _prepare(self, frame: np.ndarray, bbox: np.ndarray = None) -> dict:
+        """Builds the pipeline input for one BGR frame (full-frame box when bbox is None)."""
+        if bbox is None:
+            h, w = frame.shape[:2]
+            bbox = np.array([0, 0, w, h], dtype=np.float32)
+        data_info = dict(img=frame)
+        data_info['bbox'] = np.asarray(bbox, dtype=np.float32)[None]  # shape (1, 4)
+        data_info['bbox_score'] = np.ones(1, dtype=np.float32)  # shape (1,)
+        data_info.update(self.model.dataset_meta)
+        return self.pipeline(data_info)
+
+    @torch.no_grad()
+    def _infer(self, data_list: list) -> np.ndarray:
+        """Runs one forward pass on prepared samples. Returns (N, 133, 3) keypoints with scores."""
+        batch = pseudo_collate(data_list)
+        results = self.model.test_step(batch)
+        keypoints = np.stack([r.pred_instances.keypoints[0] for r in results], axis=0) # (N, 133, 2)
+        scores = np.stack([
+            r.pred_instances.keypoint_scores[0]
+            if 'keypoint_scores' in r.pred_instances else np.ones(keypoints.shape[1])
+            for r in results
+        ], axis=0) # (N, 133)
+        return np.concatenate([keypoints, scores[..., np.newaxis]], axis=-1).astype(np.float32)
+
+    def extract(self, frames, before_batch: callable = None, tracker=None) -> np.ndarray:
+        """
+        Extracts the kept wholebody keypoints of every frame.
+        Args:
+            frames: Iterable of BGR frames (e.g. a frame generator).
+            before_batch: Optional callable run before each forward pass (e.g. raising on cancellation).
+            tracker: Optional PersonBoxTracker (one per video). Without it every frame uses a full-frame box.
+        Returns:
+            np.ndarray: (T, 123, 3) array of (x, y, score).
+        """
+        outputs = []
+        pending = []
+        bbox = None
+        for frame in frames:
+            if not pending and tracker is not None:
+                # One box per batch: the tracker is only updated once the batch keypoints are known
+                # (PersonBoxTracker.update makes it cover the motion of the whole previous batch).
+                bbox = tracker.box_for(frame)
+            pending.append(self._prepare(frame, bbox))
+            if len(pending) == self.batch_size:
+                outputs.append(self._run_batch(pending, before_batch, tracker))
+                pending = []
+        if pending:
+            outputs.append(self._run_batch(pending, before_batch, tracker))
+
+        if not outputs:
+            return np.zeros((0, NUM_KEPT_KEYPOINTS, 3), dtype=np.float32)
+        return np.concatenate(outputs, axis=0)[:, KEPT_KEYPOINT_INDICES]
+
+
+    def _run_batch(self, pending: list, before_batch: callable, tracker) -> np.ndarray:
+        if before_batch is not None:
+            before_batch()
+        keypoints = self._infer(pending)
+        if tracker is not None:
+            tracker.update(keypoints)
+        return keypoints
+
+
+class PersonBoxTracker:
+    """
+    Detect-then-track person box for the top-down pose model (one instance per video).
+    RTMDet-nano runs on a keyframe to find the signer; the box is then propagated from the
+    pose keypoints of the previous batch of frames (union of their boxes, expanded, and only
+    shrunk progressively through an EMA), so the 384x288 crop stays tight around the signer
+    instead of covering the whole frame.
+    The detector is only called again when the keypoint confidence drops on any frame of a
+    batch, the tracked box is lost, or after `redetect_interval` frames.
+    """
+    def __init__(self, detector, det_score_thr: float = 0.3, redetect_interval: int = 150,
+                 min_confidence: float = 0.4, smoothing: float = 0.6, box_padding: float = 1.25,
+                 keypoint_thr: float = 0.3):
+        self.detector = detector
+        self.det_score_thr = det_score_thr
+        self.redetect_interval = redetect_interval
+        self.min_confidence = min_confidence
+        self.smoothing = smoothing
+        self.box_padding = box_padding
+        self.keypoint_thr = keypoint_thr
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.needs_detection = True
+        self.frames_since_detection = 0
+        self.detection_count = 0
+
+    def box_for(self, frame: np.ndarray) -> np.ndarray:
+        """Returns the (x1, y1, x2, y2) box to crop `frame` with, detecting first if needed."""
+        height, width = frame.shape[:2]
+        if self.needs_detection or self.box is None or self.frames_since_detection >= self.redetect_interval:
+            detected = self._detect(frame)
+            self.frames_since_detection = 0
+            self.needs_detection = False
+            if detected is not None:
+                self.box = detected
+        if self.box is None:
+            # Nobody detected yet: fall back to the full frame, and try again on the next batch.
+            self.needs_detection = True
+            return np.array([0, 0, width, height], dtype=np.float32)
+        return self._clip(self.box, width, height)
+
+    def update(self, keypoints: np.ndarray):
+        """
+        Propagates the box from the keypoints of the frames that were just processed.
+        The frames of a batch go through the pose model together, so the next batch is cropped with
+        one box: the padded union of the per-frame boxes of this batch, which covers the whole range
+        of hand motion seen over the batch instead of the position on its last frame only.
+        Args:
+            keypoints: (N, 133, 3) wholebody keypoints (x, y, score) of consecutive frames.
+        """
+        self.frames_since_detection += len(keypoints)
+        # Weakest frame of the batch: the signer may have been lost on any of them
+        confidence = float(keypoints[:, UPPER_BODY_KEYPOINT_INDICES, 2].mean(axis=1).min())
+        if confidence < self.min_confidence:
+            self.needs_detection = True
+            return
+
+        tracked = keypoints[:, TRACKED_KEYPOINT_INDICES]
+        valid = tracked[..., 2] > self.keypoint_thr # (N, K)
+        if valid.sum() < 2:
+            self.needs_detection = True
+            return
+        xs, ys = tracked[..., 0][valid], tracked[..., 1][valid]
+        x1, y1, x2, y2 = xs.min(), ys.min(), xs.max(), ys.max()
+        center = np.array([(x1 + x2) / 2, (y1 + y2) / 2], dtype=np.float32)
+        half_size = np.array([x2 - x1, y2 - y1], dtype=np.float32) * self.box_padding / 2
+        new_box = np.concatenate([center - half_size, center + half_size])
+        if self.box is None:
+            self.box = new_box
+            return
+        # The EMA only damps the shrinking: the box always contains the latest union, so a hand
+        # moving outward is never cut off by the smoothing
+        smoothed = self.smoothing * self.box + (1 - self.smoothing) * new_box
+        self.box = np.concatenate([np.minimum(smoothed[:2], new_box[:2]), np.maximum(smoothed[2:], new_box[2:])])
+
+    def _detect(self, frame: np.ndarray):
+        """Runs the person detector; keeps the box overlapping the current one most, else the largest."""
+        self.detection_count += 1
+        pred_instances = inference_detector(self.detector, frame).pred_instances
+        bboxes = pred_instances.bboxes.cpu().numpy()
+        scores = pred_instances.scores.cpu().numpy()
+        bboxes = bboxes[scores > self.det_score_thr]
+        if len(bboxes) == 0:
+            return None
+        if self.box is not None:
+            best = int(np.argmax(_box_iou(self.box, bboxes)))
+        else:
+            best = int(np.argmax((bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])))
+        return bboxes[best].astype(np.float32)
+
+    @staticmethod
+    def _clip(box: np.ndarray, width: int, height: int) -> np.ndarray:
+        return np.clip(box, 0, [width, height, width, height]).astype(np.float32)
+
+
+def _box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU between one (4,) box and (N, 4) boxes, all as (x1, y1, x2, y2)."""
+    inter_w = np.clip(np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1]), 0, None)
+    intersection = inter_w * inter_h
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-6)
+
+
+def normalize_keypoint_sequence(keypoints: np.ndarray) -> np.ndarray:
+    """
+    Flattens (T, N, D) keypoints to (T, N*D) and standardizes each frame
+    (zero mean, unit unbiased std, std < 1e-6 left unscaled), in one vectorized pass.
+    """
+    flattened = keypoints.reshape(keypoints.shape[0], -1).astype(np.float32)
+    mean = flattened.mean(axis=1, keepdims=True)
+    std = flattened.std(axis=1, ddof=1, keepdims=True)
+    std = np.where(std < 1e-6, np.float32(1.0), std)
+    return (flattened - mean) / std
@@ -2,9 +2,12 @@
 from flask import Blueprint, jsonify, current_app
 
 from app import db
-from app.tasks import tasks
+from app.tasks import tasks, task_executor
 from app.auth import token_required
 from app.models import TranslationReport
+from app.ai_pipeline import MODELS
+from app.pipeline_v2.pipeline_v2_orchestrator import MODELS_V2
+from app.model_registry import REGISTRY
 from flask import request
 
 bp = Blueprint('main', __name__)
@@ -46,6 +49,11 @@ def get_task_status(current_user = None, task_id = 0):
     if task.get('name') != name:
         return jsonify({'message': 'Unauthorized to view this task'}), 403
 
+    if task['status'] == 'queued':
+        # Position in the translation queue and estimated wait before processing starts
+        queue_info = task_executor.queue_info(task_id)
+        if queue_info is not None:
+            return jsonify({**task, **queue_info}), 200
     return jsonify(task), 200
 
 @bp.route('/api/task/cancel/<task_id>', methods=['POST'])
@@ -62,4 +70,46 @@ def cancel_task(current_user = None, task_id = 0):
         task['cancel_requested'] = True
         return jsonify({'message': 'Cancellation requested.'}), 200
 
+    if task['status'] == 'queued':
+        # Still waiting in the queue: removed before it starts (its upload folder is deleted)
+        if task_executor.cancel(task_id):
+            task['status'] = 'cancelled'
+            return jsonify({'message': 'Task cancelled.'}), 200
+        # Already taken by a task thread but not 'processing' yet: the task stops on its first check
+        task['cancel_requested'] = True
+        return jsonify({'message': 'Cancellation requested.'}), 200
+
     return jsonify({'message': 'Task cannot be cancelled at this stage.'}), 400
+
+
+@bp.route('/health', methods=['GET'])
+def health():
+    """Liveness + readiness: which pipelines are fully loaded, and the state of each model."""
+    return jsonify({
+        'status': 'ok',
+        'pipelines': {pipeline: REGISTRY.is_ready(pipeline) for pipeline in ('v1', 'v2')},
+        'models': REGISTRY.status(),
+    }), 200
+
+
+@bp.route('/api/metrics', methods=['GET'])
+@token_required # Queue, cache and batcher internals: authenticated users only
+def get_metrics(current_user):
+    metrics = {'task_executor': task_executor.stats()}
+    holistic_pool = MODELS_V2.get('holistic_pool')
+    if holistic_pool is not None:
+        metrics['holistic_pool'] = holistic_pool.stats()
+    ctc_predictor = MODELS.get('ctc_predictor')
+    if ctc_predictor is not None and ctc_predictor.batcher is not None:
+        metrics['ctc_batcher'] = ctc_predictor.batcher.stats()
+    for cache_name in ('gloss_translation_cache', 'text_translation_cache'):
+        if cache_name in MODELS:
+            metrics[cache_name] = MODELS[cache_name].stats()
+    for generator_name in ('gloss_generator', 'text_generator'):
+        if generator_name in MODELS:
+            metrics[generator_name] = MODELS[generator_name].stats()
+    if 't5_generator' in MODELS_V2:
+        metrics['t5_generator'] = MODELS_V2['t5_generator'].stats()
+    if 't5_latency' in MODELS_V2:
+        metrics['t5_latency_by_gloss_tokens'] = MODELS_V2['t5_latency'].stats()
+    return jsonify(metrics), 200
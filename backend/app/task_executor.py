@@ -0,0 +1,160 @@
+# backend/app/task_executor.py
+import heapq
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+class QueueFullError(RuntimeError):
+    """Raised by TaskExecutor.submit when the waiting queue is full; retry_after is in seconds."""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Translation queue is full, retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class _Job:
+    __slots__ = ('task_id', 'fn', 'args', 'on_cancel', 'started_at')
+
+    def __init__(self, task_id, fn, args, on_cancel):
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+        self.on_cancel = on_cancel
+        self.started_at = None
+
+
+class TaskExecutor:
+    """
+    Runs the translation tasks on `max_workers` threads, in FIFO order, with at most
+    `max_queue` tasks waiting. submit() raises QueueFullError (-> HTTP 429) beyond that, so
+    a burst of uploads queues up instead of running every pipeline at once on the same cores.
+    Queue position and estimated wait are derived from the running tasks' elapsed time and
+    the average duration of the completed ones (`default_duration_s` until the first completes).
+
+    Worker threads are started lazily and restarted if the process id changed, so an executor
+    created before a fork (gunicorn preload) works in each worker.
+    """
+    def __init__(self, max_workers: int = 2, max_queue: int = 16, default_duration_s: float = 30.0, name: str = 'task-executor'):
+        self.max_workers = max(int(max_workers), 1)
+        self.max_queue = max(int(max_queue), 0)
+        self.name = name
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._running = {} # task_id -> _Job
+        self._workers = []
+        self._pid = None
+        self._avg_duration = float(default_duration_s)
+        self._completed = 0
+        self._rejected = 0
+
+    def _ensure_workers(self):
+        # Called with self._cond held
+        if self._pid != os.getpid():
+            # Forked child: the parent's threads do not exist here
+            self._workers, self._running, self._pid = [], {}, os.getpid()
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._run, name=f"{self.name}-{len(self._workers)}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def is_full(self) -> bool:
+        with self._cond:
+            idle_workers = self.max_workers - len(self._running)
+            return len(self._queue) >= self.max_queue + max(idle_workers, 0)
+
+    def submit(self, task_id: str, fn: callable, args=(), on_cancel: callable = None) -> dict:
+        """
+        Queues fn(*args) for task_id. Returns its queue_info() right after queuing.
+        on_cancel() is called if the task is cancelled while still waiting.
+        """
+        with self._cond:
+            idle_workers = self.max_workers - len(self._running)
+            if len(self._queue) >= self.max_queue + max(idle_workers, 0):
+                self._rejected += 1
+                raise QueueFullError(self._retry_after())
+            self._ensure_workers()
+            self._queue.append(_Job(task_id, fn, args, on_cancel))
+            self._cond.notify()
+            return self._queue_info(task_id)
+
+    def cancel(self, task_id: str) -> bool:
+        """Removes a waiting task from the queue; False if it is not waiting (running or unknown)."""
+        with self._cond:
+            for job in self._queue:
+                if job.task_id == task_id:
+                    self._queue.remove(job)
+                    break
+            else:
+                return False
+        if job.on_cancel is not None:
+            job.on_cancel()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.started_at = time.monotonic()
+                self._running[job.task_id] = job
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                # The task functions record their own failures; this only protects the worker
+                print(f"❌ {self.name}: task {job.task_id} raised: {e}")
+            finally:
+                duration = time.monotonic() - job.started_at
+                with self._cond:
+                    self._running.pop(job.task_id, None)
+                    self._completed += 1
+                    # Moving average of the task durations, for the wait estimates
+                    self._avg_duration = duration if self._completed == 1 else 0.8 * self._avg_duration + 0.2 * duration
+
+    def _worker_free_times(self):
+        """Expected seconds until each worker is free (0 for idle workers)."""
+        now = time.monotonic()
+        free_times = [max(self._avg_duration - (now - job.started_at), 0.0) for job in self._running.values()]
+        free_times += [0.0] * (self.max_workers - len(free_times))
+        heapq.heapify(free_times)
+        return free_times
+
+    def _queue_info(self, task_id):
+        # Called with self._cond held
+        for position, job in enumerate(self._queue, start=1):
+            if job.task_id != task_id:
+                continue
+            free_times = self._worker_free_times()
+            for _ in range(position - 1): # The tasks ahead take the first free workers
+                heapq.heappush(free_times, heapq.heappop(free_times) + self._avg_duration)
+            return {'queue_position': position, 'estimated_wait_s': round(free_times[0], 1)}
+        return None
+
+    def queue_info(self, task_id: str):
+        """{'queue_position': 1-based, 'estimated_wait_s': ...} of a waiting task, None otherwise."""
+        with self._cond:
+            return self._queue_info(task_id)
+
+    def _retry_after(self) -> int:
+        # A queue slot frees up when the first waiting task starts, i.e. when the first worker is free
+        return max(1, math.ceil(min(self._worker_free_times())))
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is expected to free up (the Retry-After of a 429)."""
+        with self._cond:
+            return self._retry_after()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_task_duration_s': round(self._avg_duration, 1),
+            }
@@ -1,7 +1,8 @@
 # backend/app/tasks.py
 import os
-import cv2
-from .ai_pipeline import run_translation_pipeline, TaskCancelledError
+from .ai_pipeline import run_translation_pipeline
+from .errors import TaskCancelledError
+from .frame_source import iter_video_frames, FrameStore
 from flask import current_app
 import shutil
 from flask import current_app # Used for logging or accessing app config if needed, not strictly for paths here
@@ -9,11 +10,16 @@ from flask import current_app # Used for logging or accessing app config if need
 # Import for Pipeline V1
 from .ai_pipeline import run_translation_pipeline
 from .pipeline_v2.pipeline_v2_orchestrator import run_translation_pipeline_v2
+from .pipeline_v2 import config as v2_config
+from .task_executor import TaskExecutor
+from config import Config
 import shutil
 
 tasks = {}
+# Uploaded videos wait here for one of the TASK_WORKERS translation threads (see video.upload_video)
+task_executor = TaskExecutor(Config.TASK_WORKERS, Config.TASK_QUEUE_SIZE, Config.TASK_DEFAULT_DURATION_S, name='translation-task')
 UPLOAD_FOLDER = 'uploads'
-def translate_video_task(task_id: str, video_path: str,targetLang: str):
+def translate_video_task(task_id: str, video_path: str,targetLang: str, save_debug_frames: bool = False):
 
 # Import for Pipeline V2
 
@@ -23,7 +29,8 @@ def translate_video_task(task_id: str, video_path: str,targetLang: str):
 # instance/uploads/<task_id>/video.mp4
 # So, os.path.dirname(video_path) will give the task-specific temp directory.
     """
-    Runs the complete Pipeline V1: frame extraction THEN translation.
+    Runs the complete Pipeline V1: frames are decoded and streamed straight into the translation.
+    With save_debug_frames, the decoded frames are also dumped into frames_v1/ for inspection.
     """
     task = tasks.get(task_id)
     if not task:
@@ -38,28 +45,13 @@ def translate_video_task(task_id: str, video_path: str,targetLang: str):
     task_temp_dir = os.path.dirname(video_path)
     cancellation_checker = lambda: task.get('cancel_requested', False)
     
-    # Frames for Pipeline V1 will be stored in a 'frames' subdirectory within the task_temp_dir
-    frames_dir_v1 = os.path.join(task_temp_dir, 'frames_v1') # Make it explicit for V1
-    os.makedirs(frames_dir_v1, exist_ok=True)
+    # Frames are only written to disk in debug mode, in a 'frames_v1' subdirectory of the task_temp_dir
+    frames_dir_v1 = os.path.join(task_temp_dir, 'frames_v1') if save_debug_frames else None
     try:
-        print(f"Task {task_id} (V1): Starting frame extraction from {video_path} into {frames_dir_v1}")
-        vidcap = cv2.VideoCapture(video_path)
-        success, image = vidcap.read()
-        count = 0
-        while success:
-            if cancellation_checker():
-                raise TaskCancelledError("Cancelled during frame extraction.")
-            
-            cv2.imwrite(os.path.join(frames_dir_v1, f"frame{count:05d}.jpg"), image)
-            success, image = vidcap.read()
-            count += 1
-        
-        if count == 0:
-            raise ValueError("Pipeline V1: Could not extract any frames from the video. It might be corrupted or in an unsupported format.")
-        
-        print(f"Task {task_id} (V1): Successfully extracted {count} frames to {frames_dir_v1}")
+        print(f"Task {task_id} (V1): Streaming frames from {video_path}" + (f" (debug dump into {frames_dir_v1})" if frames_dir_v1 else ""))
+        frames = iter_video_frames(video_path, cancellation_checker, debug_frames_dir=frames_dir_v1)
 
-        result = run_translation_pipeline(frames_dir_v1, task_temp_dir, targetLang, cancellation_checker)
+        result = run_translation_pipeline(frames, task_temp_dir, targetLang, cancellation_checker)
 
         task['status'] = 'completed'
         task['result'] = result
@@ -87,9 +79,10 @@ def translate_video_task(task_id: str, video_path: str,targetLang: str):
             # current_app.logger.error(f"Error during V1 cleanup for task {task_id}: {e_clean}")
 
 
-def translate_video_task_v2(task_id: str, video_path: str,targetLang: str):
+def translate_video_task_v2(task_id: str, video_path: str,targetLang: str, save_debug_frames: bool = False):
     """
-    Runs the complete Pipeline V2: frame extraction THEN translation.
+    Runs the complete Pipeline V2: the video is decoded once into a FrameStore THEN translated.
+    With save_debug_frames, the decoded frames are also dumped into frames_v2/ for inspection.
     """
     task = tasks.get(task_id)
     if not task:
@@ -101,33 +94,34 @@ def translate_video_task_v2(task_id: str, video_path: str,targetLang: str):
     
     # task_temp_dir is the unique directory for this specific task's files
     task_temp_dir = os.path.dirname(video_path)
+    cancellation_checker = lambda: task.get('cancel_requested', False)
     
-    # Frames for Pipeline V2 will be stored in a 'frames_v2' subdirectory
-    frames_dir_v2 = os.path.join(task_temp_dir, 'frames_v2')
-    os.makedirs(frames_dir_v2, exist_ok=True)
+    # Frames are only written to disk in debug mode, in a 'frames_v2' subdirectory
+    frames_dir_v2 = os.path.join(task_temp_dir, 'frames_v2') if save_debug_frames else None
+    frame_store = None
 
     try:
-        print(f"Task {task_id} (V2): Starting frame extraction from {video_path} into {frames_dir_v2}")
-        vidcap = cv2.VideoCapture(video_path)
-        success, image = vidcap.read()
-        count = 0
-        while success:
-            cv2.imwrite(os.path.join(frames_dir_v2, f"frame{count:05d}.jpg"), image)
-            success, image = vidcap.read()
-            count += 1
+        print(f"Task {task_id} (V2): Decoding frames from {video_path}")
+        num_samples = v2_config.NUM_FRAMES if v2_config.SAMPLED_FRAME_DECODING else None
+        frame_store = FrameStore.from_video(video_path, cancellation_checker, debug_frames_dir=frames_dir_v2,
+                                            spill_dir=task_temp_dir, num_samples=num_samples)
         
-        if count == 0:
+        if len(frame_store) == 0:
             raise ValueError("Pipeline V2: Could not extract any frames from the video. It might be corrupted or in an unsupported format.")
         
-        print(f"Task {task_id} (V2): Successfully extracted {count} frames to {frames_dir_v2}")
+        print(f"Task {task_id} (V2): Successfully decoded {len(frame_store)}/{frame_store.num_source_frames} frames" + (" (memmap)" if frame_store.memmap_path else ""))
 
         # Call Pipeline V2's translation function
-        result = run_translation_pipeline_v2(frames_dir_v2, task_temp_dir,targetLang)
+        result = run_translation_pipeline_v2(frame_store, task_temp_dir,targetLang)
 
         task['status'] = 'completed'
         task['result'] = result
         print(f"✅ Pipeline V2 Processing completed for task {task_id}. Result: '{result}'")
 
+    except TaskCancelledError:
+        task['status'] = 'cancelled'
+        print(f"🛑 Task {task_id} was cancelled by the user.")
+
     except Exception as e:
         task['status'] = 'failed'
         task['error'] = str(e)
@@ -135,6 +129,8 @@ def translate_video_task_v2(task_id: str, video_path: str,targetLang: str):
         # current_app.logger.error(f"Pipeline V2 Processing FAILED for task {task_id}: {e}", exc_info=True)
         
     finally:
+        if frame_store is not None:
+            frame_store.close()
         # Clean up the specific temporary directory for this task
         try:
             if os.path.exists(task_temp_dir):
@@ -0,0 +1,150 @@
+# backend/app/translation_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def hf_model_id(model, extra: str = '') -> str:
+    """
+    Identifier of a loaded transformers model for cache keys: its name/path and the hub commit
+    hash it was loaded from, or the size/mtime of the weight files for a local folder.
+    A new checkpoint therefore gets a new id, and the old cache entries stop matching.
+    """
+    config = model.config
+    name = getattr(config, 'name_or_path', '') or model.__class__.__name__
+    revision = getattr(config, '_commit_hash', None)
+    if not revision and os.path.isdir(name):
+        revision = ','.join(
+            f"{entry.name}:{entry.stat().st_size}:{int(entry.stat().st_mtime)}"
+            for entry in sorted(os.scandir(name), key=lambda e: e.name) if entry.is_file()
+        )
+    return f"{name}{'/' + extra if extra else ''}@{revision or 'unknown'}"
+
+
+class TranslationCache:
+    """
+    Two-level cache of translation outputs.
+    Entries are keyed by (model id, normalized input text, decoding params); the first level
+    is an in-process LRU of `max_entries` items, the optional second level a SQLite file shared
+    by the gunicorn workers and kept across restarts. Rows written by another model id (an
+    older checkpoint) are deleted when the cache is opened. stats() reports the hit rates.
+    """
+    def __init__(self, name: str, model_id: str, max_entries: int = 1024, db_path: str = None):
+        self.name = name
+        self.model_id = model_id
+        self.max_entries = max(int(max_entries), 0)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._db = None
+        self._pid = None
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if self.db_path:
+            self._invalidate_stale_rows()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.split())
+
+    def _key(self, text: str, params: dict) -> str:
+        raw = json.dumps([self.model_id, self.normalize(text), params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _connection(self):
+        # One connection per process (sqlite connections must not cross a fork); access is serialized by _lock
+        if self._db is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "cache TEXT NOT NULL, key TEXT NOT NULL, model_id TEXT NOT NULL, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (cache, key))"
+            )
+            self._pid = os.getpid()
+        return self._db
+
+    def _invalidate_stale_rows(self):
+        try:
+            with self._lock:
+                db = self._connection()
+                with db:
+                    deleted = db.execute("DELETE FROM translations WHERE cache = ? AND model_id != ?",
+                                         (self.name, self.model_id)).rowcount
+            if deleted:
+                print(f"🧹 {self.name} cache: dropped {deleted} entries of a previous checkpoint.")
+        except sqlite3.Error as e:
+            print(f"⚠️ {self.name} cache: disk tier disabled ({e}).")
+            self.db_path = None
+
+    def get(self, text: str, params: dict = None):
+        """Returns the cached output for this input and params, or None."""
+        key = self._key(text, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._memory_hits += 1
+                return self._entries[key]
+            value = None
+            if self.db_path:
+                try:
+                    row = self._connection().execute("SELECT value FROM translations WHERE cache = ? AND key = ?",
+                                                     (self.name, key)).fetchone()
+                    value = row[0] if row else None
+                except sqlite3.Error as e:
+                    print(f"⚠️ {self.name} cache: disk read failed ({e}).")
+            if value is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, text: str, params: dict, value: str):
+        key = self._key(text, params)
+        with self._lock:
+            self._remember(key, value)
+            if self.db_path:
+                try:
+                    db = self._connection()
+                    with db:
+                        db.execute("INSERT OR REPLACE INTO translations (cache, key, model_id, value, created_at) "
+                                   "VALUES (?, ?, ?, ?, ?)", (self.name, key, self.model_id, value, time.time()))
+                except sqlite3.Error as e:
+                    print(f"⚠️ {self.name} cache: disk write failed ({e}).")
+
+    def _remember(self, key, value):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.db_path:
+                db = self._connection()
+                with db:
+                    db.execute("DELETE FROM translations WHERE cache = ?", (self.name,))
+
+    def stats(self) -> dict:
+        lookups = self._memory_hits + self._disk_hits + self._misses
+        return {
+            'model_id': self.model_id,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'disk': bool(self.db_path),
+            'lookups': lookups,
+            'memory_hits': self._memory_hits,
+            'disk_hits': self._disk_hits,
+            'misses': self._misses,
+            'hit_rate': (self._memory_hits + self._disk_hits) / lookups if lookups else 0.0,
+        }
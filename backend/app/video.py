@@ -1,14 +1,20 @@
 # backend/app/video.py
 from flask import Blueprint, request, jsonify, current_app # Added current_app
 import os
-import threading
 import uuid
-from app.tasks import tasks, translate_video_task, translate_video_task_v2 # Import both tasks
+from app.tasks import tasks, task_executor, translate_video_task, translate_video_task_v2 # Import both tasks
+from app.task_executor import QueueFullError
 from app.auth import token_required
 import shutil
 
 bp = Blueprint('video', __name__)
 
+
+def queue_full_response(error: QueueFullError):
+    response = jsonify({'message': 'Too many videos are being translated, please retry later.', 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
 # UPLOAD_FOLDER will be taken from app.config['UPLOAD_FOLDER']
     
 @bp.route('/upload', methods=['POST'])
@@ -31,6 +37,10 @@ def upload_video(current_user = None):
         if target_lang == '':
             return jsonify({'message': 'No target language'}),400
 
+        # Admission control before saving the video: no worker free and the queue is full
+        if task_executor.is_full():
+            return queue_full_response(QueueFullError(task_executor.retry_after()))
+
         if file:
             task_id = str(uuid.uuid4())
             # Create a unique directory for this task's files
@@ -47,18 +57,23 @@ def upload_video(current_user = None):
             
             print(f"File '{file.filename}' received from user {name}, saved to {file_path}.")
 
-            tasks[task_id] = {'status': 'pending', 'name': name, 'pipeline': pipeline_choice}
+            tasks[task_id] = {'status': 'queued', 'name': name, 'pipeline': pipeline_choice}
 
-            if pipeline_choice == 'v2':
-                thread = threading.Thread(target=translate_video_task_v2, args=(task_id, file_path, target_lang))
-                print(f"Starting Pipeline V2 for task {task_id}")
-            else: # Default or 'v1'
-                thread = threading.Thread(target=translate_video_task, args=(task_id, file_path, target_lang))
-                thread = threading.Thread(target=translate_video_task, args=(task_id, file_path, target_lang))
-                print(f"Starting Pipeline V1 for task {task_id}")
-            thread.start()
+            save_debug_frames = current_app.config.get('SAVE_DEBUG_FRAMES', False)
+            task_function = translate_video_task_v2 if pipeline_choice == 'v2' else translate_video_task # Default or 'v1'
+            try:
+                queue_info = task_executor.submit(
+                    task_id, task_function, args=(task_id, file_path, target_lang, save_debug_frames),
+                    on_cancel=lambda: shutil.rmtree(task_specific_dir, ignore_errors=True),
+                )
+            except QueueFullError as e:
+                # Another upload took the last slot while this one was being saved
+                tasks.pop(task_id, None)
+                shutil.rmtree(task_specific_dir, ignore_errors=True)
+                return queue_full_response(e)
+            print(f"Queued Pipeline {pipeline_choice.upper()} for task {task_id} (position {queue_info['queue_position']})")
 
-            return jsonify({'message': f'Upload successful, processing with {pipeline_choice} started.', 'task_id': task_id}), 202
+            return jsonify({'message': f'Upload successful, processing with {pipeline_choice} queued.', 'task_id': task_id, **queue_info}), 202
         else:
             return jsonify({'message': 'File object is not valid'}), 400
             
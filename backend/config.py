@@ -10,4 +10,63 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'another-super-secret-jwt-key'
\ No newline at end of file
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'another-super-secret-jwt-key'
+
+    # --- AI pipelines ---
+    # Dump every decoded frame as a JPEG in the task folder (debug only, slow).
+    SAVE_DEBUG_FRAMES = os.environ.get('SAVE_DEBUG_FRAMES', 'false').lower() == 'true'
+    # Save the V1 normalized features (keypoints.npy) in the task folder (debug only, the CTC model reads them from memory).
+    SAVE_DEBUG_FEATURES = os.environ.get('SAVE_DEBUG_FEATURES', 'false').lower() == 'true'
+    # Number of frames sent through the V1 pose model (RTMPose) per forward pass.
+    POSE_BATCH_SIZE = int(os.environ.get('POSE_BATCH_SIZE', 16))
+    # Detect-then-track person boxes for the V1 pose model (RTMDet-nano + keypoint-propagated box).
+    # Off by default: the CTC model was trained on keypoints extracted with full-frame boxes.
+    POSE_PERSON_TRACKING = os.environ.get('POSE_PERSON_TRACKING', 'false').lower() == 'true'
+    # URL (converted once into the artifact store, see ARTIFACT_STORE_*) or local path of the RTMDet-nano checkpoint.
+    POSE_DET_CHECKPOINT = os.environ.get('POSE_DET_CHECKPOINT') or \
+        'https://download.openmmlab.com/mmpose/v1/projects/rtmpose/rtmdet_nano_8xb32-100e_coco-obj365-person-05d8511e.pth'
+    POSE_TRACK_REDETECT_INTERVAL = int(os.environ.get('POSE_TRACK_REDETECT_INTERVAL', 150)) # frames
+    POSE_TRACK_MIN_CONFIDENCE = float(os.environ.get('POSE_TRACK_MIN_CONFIDENCE', 0.4))
+    # CTC decoding (V1). Beam width 1 is greedy; with CTC_LM_PATH (a gloss LM .npz built by
+    # POC2/SLR/gloss_lm.py) the beam search adds CTC_LM_WEIGHT * LM score + CTC_LM_INSERTION_BONUS per gloss.
+    CTC_BEAM_WIDTH = int(os.environ.get('CTC_BEAM_WIDTH', 1))
+    CTC_LM_PATH = os.environ.get('CTC_LM_PATH')
+    CTC_LM_WEIGHT = float(os.environ.get('CTC_LM_WEIGHT', 0.5))
+    CTC_LM_INSERTION_BONUS = float(os.environ.get('CTC_LM_INSERTION_BONUS', 1.0))
+    # Cross-request micro-batching of the V1 CTC model: concurrent requests are grouped for up to
+    # CTC_BATCH_MAX_WAIT_MS or CTC_BATCH_MAX_SIZE sequences into one forward pass (1 disables it).
+    CTC_BATCH_MAX_SIZE = int(os.environ.get('CTC_BATCH_MAX_SIZE', 8))
+    CTC_BATCH_MAX_WAIT_MS = float(os.environ.get('CTC_BATCH_MAX_WAIT_MS', 10))
+    # CPU inference mode of the V1 CTC model: dynamic int8 for the BiLSTM and CTC head, and conv/BN folding
+    # in the temporal CNN. Check accuracy first with `python -m app.POC2.check_quantization_parity`.
+    CTC_QUANTIZE = os.environ.get('CTC_QUANTIZE', 'false').lower() == 'true'
+    CTC_FUSE_CONV_BN = os.environ.get('CTC_FUSE_CONV_BN', 'false').lower() == 'true'
+    # Frozen TorchScript export of the V1 temporal CNN (BN folded, dropout stripped, implies CTC_FUSE_CONV_BN),
+    # cached in CTC_EXPORT_CACHE_DIR under the checkpoint hash (pre-build it with `python -m app.POC2.export_ctc`).
+    CTC_TORCHSCRIPT = os.environ.get('CTC_TORCHSCRIPT', 'false').lower() == 'true'
+    CTC_EXPORT_CACHE_DIR = os.environ.get('CTC_EXPORT_CACHE_DIR') or os.path.join(basedir, 'instance', 'model_cache')
+    # Cache of the gloss -> German (GlossTranslator) and NLLB translations: in-process LRU of
+    # TRANSLATION_CACHE_SIZE entries (0 disables it) + SQLite file kept across restarts (empty path disables it).
+    TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 2048))
+    TRANSLATION_CACHE_DB = os.environ.get('TRANSLATION_CACHE_DB', os.path.join(basedir, 'instance', 'translation_cache.db'))
+    # Micro-batching of the seq2seq generate() calls (GlossTranslator, NLLB): concurrent requests are grouped
+    # for up to SEQ2SEQ_BATCH_MAX_WAIT_MS or SEQ2SEQ_BATCH_MAX_SIZE texts, padded to the longest (1 disables it).
+    SEQ2SEQ_BATCH_MAX_SIZE = int(os.environ.get('SEQ2SEQ_BATCH_MAX_SIZE', 8))
+    SEQ2SEQ_BATCH_MAX_WAIT_MS = float(os.environ.get('SEQ2SEQ_BATCH_MAX_WAIT_MS', 15))
+    # Pipelines whose models are loaded at startup ('v1', 'v2', comma-separated), or single models (e.g. 'text_translator',
+    # the NLLB model used for non-German targets). Other models are loaded on first use, so CLI commands (flask db ...)
+    # start without loading any model. The Docker image preloads everything.
+    PRELOAD_PIPELINES = [p.strip() for p in os.environ.get('PRELOAD_PIPELINES', '').split(',') if p.strip()]
+    # Preloaded models are loaded by PRELOAD_WORKERS threads, then each runs one synthetic warm-up inference.
+    PRELOAD_WORKERS = int(os.environ.get('PRELOAD_WORKERS', 4))
+    PRELOAD_WARMUP = os.environ.get('PRELOAD_WARMUP', 'true').lower() == 'true'
+    # Local artifact store of the hub checkpoints (MMPose, CTC, V2 SLR and T5): converted once to weights-only
+    # safetensors, then read at startup without any network access. CHECK_UPDATES asks the hub for newer files.
+    ARTIFACT_STORE_ENABLED = os.environ.get('ARTIFACT_STORE_ENABLED', 'true').lower() == 'true'
+    ARTIFACT_STORE_DIR = os.environ.get('ARTIFACT_STORE_DIR') or os.path.join(basedir, 'instance', 'artifacts')
+    ARTIFACT_STORE_CHECK_UPDATES = os.environ.get('ARTIFACT_STORE_CHECK_UPDATES', 'false').lower() == 'true'
+    # Translation tasks run on TASK_WORKERS threads per process; at most TASK_QUEUE_SIZE uploads wait for a free
+    # worker (FIFO), further uploads get a 429 with Retry-After. TASK_DEFAULT_DURATION_S seeds the wait estimates.
+    TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 2))
+    TASK_QUEUE_SIZE = int(os.environ.get('TASK_QUEUE_SIZE', 8))
+    TASK_DEFAULT_DURATION_S = float(os.environ.get('TASK_DEFAULT_DURATION_S', 30))
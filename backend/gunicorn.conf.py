@@ -0,0 +1,36 @@
+# backend/gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+import torch
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+# One worker by default: the task state (app.tasks.tasks) and the task queue live in the worker's memory, so
+# the status / cancel requests of a task must reach the worker that received its upload. More than one worker
+# needs that state moved to a store shared by the workers first (see the README).
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Uploads are queued for the task threads (TASK_WORKERS), status polling is cheap: the request threads
+# only have to cover the concurrent uploads and polls
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Load the models once in the master, then fork: the workers share the weights copy-on-write.
+# CUDA cannot be used in a process forked after its initialization, so on GPU every worker loads its own models.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false' if torch.cuda.is_available() else 'true').lower() == 'true'
+if preload_app:
+    # The master must stay single-threaded: the OpenMP pool created by a multi-threaded forward pass
+    # (the preload warm-ups) does not survive the fork, and the workers would hang on their first
+    # torch operation. post_fork then gives each worker its real thread count.
+    torch.set_num_threads(1)
+
+# Intra-op torch threads per worker (0 = the cores split evenly between the workers)
+torch_threads_per_worker = int(os.environ.get('TORCH_THREADS_PER_WORKER', 0))
+
+
+def post_fork(server, worker):
+    # Without this every worker starts one thread per core, and N workers oversubscribe the CPU N times
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    num_threads = torch_threads_per_worker or max(1, cores // workers)
+    torch.set_num_threads(num_threads)
+    server.log.info(f"Worker {worker.pid}: torch intra-op threads = {num_threads}")
@@ -1,9 +1,13 @@
 # backend/run.py
+import os
 from app import create_app, db
 from app.models import User
 
 app = create_app()
 
 if __name__ == '__main__':
-    # Run on 0.0.0.0 to be accessible from your mobile device on the same network
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server only (production: gunicorn -c gunicorn.conf.py wsgi:app).
+    # Run on 0.0.0.0 to be accessible from your mobile device on the same network.
+    # FLASK_DEBUG=true enables the debugger and the reloader (which imports the app, and loads the models, twice).
+    debug = os.environ.get('FLASK_DEBUG', 'false').lower() in ('1', 'true')
+    app.run(host='0.0.0.0', port=5000, debug=debug)
\ No newline at end of file
@@ -0,0 +1,26 @@
+# backend/wsgi.py
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# With preload_app (gunicorn.conf.py), this module is imported once by the gunicorn master:
+# the models are loaded here, then the workers are forked and share the weights copy-on-write.
+import gc
+import os
+
+# The master loads every pipeline and NLLB before forking (set PRELOAD_PIPELINES to change it):
+# a model loaded lazily after the fork would be a private copy in each worker
+os.environ.setdefault('PRELOAD_PIPELINES', 'v1,v2,text_translator')
+
+from app import create_app
+from app.pipeline_v2.pipeline_v2_orchestrator import MODELS_V2
+
+# gunicorn.conf.py has already set torch to one thread: the models are loaded and warmed up
+# single-threaded here, so the workers can fork safely (see post_fork for their thread count)
+app = create_app()
+
+# MediaPipe graphs run their own threads, which do not survive a fork: the graph created by the
+# warm-up is closed, each worker creates its own on first use.
+if 'holistic_pool' in MODELS_V2:
+    MODELS_V2['holistic_pool'].close()
+
+# Moves everything allocated so far (models, modules) to the permanent GC generation, so the
+# collector never writes to those objects and their memory pages stay shared with the workers.
+gc.freeze()